@@ -0,0 +1,78 @@
+# -*- coding: utf-8 -*-
+# :Project:   metapensiero.util.stream -- per source/consumer memory benchmark
+# :Created:   lun 19 ott 2026 16:22:09 CEST
+# :Author:    Alberto Berti <alberto@metapensiero.it>
+# :License:   GNU General Public License version 3 or later
+# :Copyright: © 2026 Alberto Berti
+#
+
+"""Measure the memory used to track each source of a `Selector` and each
+consumer of a `Tee`, comparing the ``__slots__`` state objects with the
+dictionaries and events used before.
+
+Run it with ``python bench/bench_state_memory.py [count]``.
+"""
+
+import asyncio
+import collections
+import sys
+import tracemalloc
+
+from metapensiero.util.stream.selector import (FutureValue, SELECTOR_STATUS,
+                                               SourceState)
+from metapensiero.util.stream.tee import ConsumerState, Tee
+
+
+def measure(count, factory):
+    """Return the average number of bytes allocated by `factory`."""
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    objs = [factory(i) for i in range(count)]
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del objs
+    # don't count the list holding the objects
+    return (after - before - sys.getsizeof([None] * count)) / count
+
+
+def main(count=10000):
+    loop = asyncio.get_event_loop()
+
+    def source_dict(i):
+        return {'status': SELECTOR_STATUS.STARTED, 'send_capable': True,
+                'send_value': None, 'task': None}
+
+    def source_state(i):
+        return SourceState(True)
+
+    def consumer_event(i):
+        return asyncio.Event(loop=loop), collections.deque()
+
+    def consumer_state(i):
+        return ConsumerState()
+
+    def send_event(i):
+        return asyncio.Event(loop=loop)
+
+    def send_value(i):
+        return FutureValue(loop=loop)
+
+    results = [
+        ('per source, dict state', measure(count, source_dict)),
+        ('per source, SourceState', measure(count, source_state)),
+        ('per send-capable source, Event', measure(count, send_event)),
+        ('per send-capable source, FutureValue', measure(count, send_value)),
+        ('per consumer, Event + deque', measure(count, consumer_event)),
+        ('per consumer, ConsumerState', measure(count, consumer_state)),
+    ]
+
+    tee = Tee(push_mode=True, loop=loop)
+    results.append(('per consumer, Tee with ConsumerState',
+                    measure(count, lambda i: tee._add_consumer())))
+
+    for name, size in results:
+        print('%-40s %8.1f bytes' % (name, size))
+
+
+if __name__ == '__main__':
+    main(*(int(a) for a in sys.argv[1:]))
@@ -0,0 +1,60 @@
+# -*- coding: utf-8 -*-
+# :Project:   metapensiero.util.stream -- Tee topic routing benchmark
+# :Created:   mar 20 ott 2026 01:12:40 CEST
+# :Author:    Alberto Berti <alberto@metapensiero.it>
+# :License:   GNU General Public License version 3 or later
+# :Copyright: © 2026 Alberto Berti
+#
+
+"""Compare many `Tee` consumers that each filter the values they want
+with the same consumers subscribed by key, so that the values are
+routed only to them.
+
+Each consumer wants 1% of the values. Run it with ``python
+bench/bench_tee_topics.py [consumers [count]]``.
+"""
+
+import asyncio
+import sys
+import time
+
+from metapensiero.util.stream import Tee
+
+
+async def consume(consumer, key=None):
+    received = 0
+    async for value in consumer:
+        if key is None or value % 100 == key:
+            received += 1
+    return received
+
+
+async def run(loop, consumers, count, routed):
+    tee = Tee(push_mode=True, loop=loop, key=lambda v: v % 100)
+    if routed:
+        tasks = [consume(tee.subscribe(key=i % 100)) for i in range(consumers)]
+    else:
+        tasks = [consume(tee.__aiter__(), i % 100) for i in range(consumers)]
+    fut = asyncio.gather(*tasks, loop=loop)
+    begin = time.perf_counter()
+    for i in range(count):
+        tee.push(i)
+        if i % 100 == 99:
+            await asyncio.sleep(0, loop=loop)
+    tee.close()
+    received = await fut
+    return time.perf_counter() - begin, sum(received)
+
+
+def main(consumers=1000, count=20000):
+    loop = asyncio.get_event_loop()
+    for label, routed in [('filtered', False), ('routed', True)]:
+        elapsed, received = loop.run_until_complete(
+            run(loop, consumers, count, routed))
+        print('%-9s %8.0f items/s, %d delivered' % (label, count / elapsed,
+                                                    received))
+    loop.close()
+
+
+if __name__ == '__main__':
+    main(*(int(a) for a in sys.argv[1:3]))
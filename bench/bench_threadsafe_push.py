@@ -0,0 +1,84 @@
+# -*- coding: utf-8 -*-
+# :Project:   metapensiero.util.stream -- push from foreign threads benchmark
+# :Created:   lun 19 ott 2026 20:31:52 CEST
+# :Author:    Alberto Berti <alberto@metapensiero.it>
+# :License:   GNU General Public License version 3 or later
+# :Copyright: © 2026 Alberto Berti
+#
+
+"""Compare pushing values into a `Tee` from another thread using
+`Tee.push_threadsafe()` with scheduling each `Tee.push()` call with
+``loop.call_soon_threadsafe()``.
+
+The producer thread tries to keep the given rate (1M items/s by
+default). Run it with ``python bench/bench_threadsafe_push.py [count
+[rate]]``.
+"""
+
+import asyncio
+import sys
+import threading
+import time
+
+from metapensiero.util.stream import Tee
+
+
+def producer(push, count, rate, done):
+    chunk = 1000
+    begin = time.perf_counter()
+    for start in range(0, count, chunk):
+        for i in range(start, min(start + chunk, count)):
+            push(i)
+        delay = begin + (start + chunk) / rate - time.perf_counter()
+        if delay > 0:
+            time.sleep(delay)
+    done()
+
+
+async def run(loop, count, rate, threadsafe):
+    tee = Tee(push_mode=True, loop=loop)
+    consumer = tee.__aiter__()
+    wakeups = 0
+    call_soon_threadsafe = loop.call_soon_threadsafe
+
+    def counting_call_soon_threadsafe(*args):
+        nonlocal wakeups
+        wakeups += 1
+        return call_soon_threadsafe(*args)
+
+    loop.call_soon_threadsafe = counting_call_soon_threadsafe
+    if threadsafe:
+        push, done = tee.push_threadsafe, tee.close_threadsafe
+    else:
+        def push(value):
+            loop.call_soon_threadsafe(tee.push, value)
+
+        def done():
+            loop.call_soon_threadsafe(tee.close)
+
+    thread = threading.Thread(target=producer,
+                              args=(push, count, rate, done))
+    begin = time.perf_counter()
+    thread.start()
+    received = 0
+    async for _ in consumer:
+        received += 1
+    elapsed = time.perf_counter() - begin
+    thread.join()
+    del loop.call_soon_threadsafe
+    assert received == count
+    return elapsed, wakeups
+
+
+def main(count=1000000, rate=1000000):
+    loop = asyncio.get_event_loop()
+    for name, threadsafe in (('call_soon_threadsafe per item', False),
+                             ('Tee.push_threadsafe', True)):
+        elapsed, wakeups = loop.run_until_complete(
+            run(loop, count, rate, threadsafe))
+        print('%-30s %8.3f s %12.0f items/s %9d wakeups' % (
+            name, elapsed, count / elapsed, wakeups))
+
+
+if __name__ == '__main__':
+    main(*(int(a) for a in sys.argv[1:]))
@@ -0,0 +1,67 @@
+# -*- coding: utf-8 -*-
+# :Project:   metapensiero.util.stream -- tracing overhead benchmark
+# :Created:   lun 19 ott 2026 23:58:06 CEST
+# :Author:    Alberto Berti <alberto@metapensiero.it>
+# :License:   GNU General Public License version 3 or later
+# :Copyright: © 2026 Alberto Berti
+#
+
+"""Measure the cost of tracing on a ``Tee -> Transformer -> Sink``
+pipeline, without a tracer, with sampling turned off and with a few
+sampling rates.
+
+Each case is warmed up, then the cases are run in turn `repeat` times
+(5 by default), so that a slow drift of the machine affects them all
+alike. The best and the median throughput are reported and the
+overhead is computed on the best times, the least disturbed ones.
+
+Run it with ``python bench/bench_tracing.py [count [repeat]]``.
+"""
+
+import asyncio
+import gc
+import statistics
+import sys
+import time
+
+from metapensiero.util.stream import Sink, Tee, Tracer, Transformer
+from metapensiero.util.stream.testing import make_async_gen
+
+
+async def run(loop, count, tracer):
+    tee = Tee(make_async_gen(range(count)), loop=loop, tracer=tracer)
+    sink = Sink(Transformer(lambda v: v + 1, None, tee, tracer=tracer),
+                tracer=tracer)
+    gc.collect()
+    begin = time.perf_counter()
+    await sink.start()
+    await sink._run_fut
+    return time.perf_counter() - begin
+
+
+def main(count=200000, repeat=5):
+    loop = asyncio.get_event_loop()
+    cases = [('no tracer', lambda: None),
+             ('sampling off', lambda: Tracer(0)),
+             ('sampling 1%', lambda: Tracer(0.01)),
+             ('sampling 100%', lambda: Tracer(1))]
+    for _, tracer in cases:
+        loop.run_until_complete(run(loop, count // 10, tracer()))
+    times = {label: [] for label, _ in cases}
+    for _ in range(repeat):
+        for label, tracer in cases:
+            times[label].append(loop.run_until_complete(
+                run(loop, count, tracer())))
+    baseline = min(times['no tracer'])
+    print('%-14s %14s %14s %8s' % ('', 'best items/s', 'median items/s',
+                                   'overhead'))
+    for label, _ in cases:
+        best = min(times[label])
+        print('%-14s %14.0f %14.0f %+7.1f%%' % (
+            label, count / best, count / statistics.median(times[label]),
+            (best / baseline - 1) * 100))
+    loop.close()
+
+
+if __name__ == '__main__':
+    main(*(int(a) for a in sys.argv[1:3]))
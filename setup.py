@@ -34,21 +34,23 @@ setup(
         "Development Status :: 2 - Pre-Alpha",
         "Programming Language :: Python",
         "Programming Language :: Python :: 3",
-        "Programming Language :: Python :: 3.6",
+        "Programming Language :: Python :: 3.7",
         ],
     keywords="",
 
     packages=['metapensiero.util.' + pkg
               for pkg in find_packages('src/metapensiero/util')],
     package_dir={'': 'src'},
-    namespace_packages=['metapensiero', 'metapensiero.util'],
+    python_requires='>=3.7',
 
-    install_requires=['setuptools'],
     extras_require={
         'dev': [
             'metapensiero.tool.bump_version',
             'readme_renderer',
-        ]
+        ],
+        'msgpack': [
+            'msgpack',
+        ],
     },
     setup_requires=[
         'pytest-runner'
@@ -6,10 +6,55 @@
 # :Copyright: © 2018 Alberto Berti
 #
 
-
 STOPPED_TOKEN = object()
 
-from .selector import Selector
-from .sink import Sink
-from .tee import Tee, TEE_MODE, TEE_STATUS
-from .transformer import Transformer
+# The public names are loaded from their modules on first access, to
+# keep the import of the package (and of asyncio) off the startup path
+# of the programs that don't use them.
+_LAZY_ATTRIBUTES = {
+    'AdaptiveBatching': 'batching',
+    'Batcher': 'batching',
+    'BlockingSource': 'blocking',
+    'BloomIndex': 'cache',
+    'BridgeServer': 'bridge',
+    'BridgeSource': 'bridge',
+    'LRUCache': 'cache',
+    'LRUIndex': 'cache',
+    'TTLCache': 'cache',
+    'TTLIndex': 'cache',
+    'CheckpointStore': 'checkpoint',
+    'FileCheckpointStore': 'checkpoint',
+    'SQLiteCheckpointStore': 'checkpoint',
+    'Deduplicator': 'dedup',
+    'FileTail': 'tail',
+    'ERROR_POLICY': 'errors',
+    'StreamError': 'errors',
+    'MergeSelector': 'merge',
+    'Pipeline': 'pipeline',
+    'PIPELINE_STATUS': 'pipeline',
+    'SourcePool': 'pool',
+    'Selector': 'selector',
+    'Sink': 'sink',
+    'Tee': 'tee',
+    'TEE_MODE': 'tee',
+    'TEE_STATUS': 'tee',
+    'Tracer': 'tracing',
+    'Transformer': 'transformer',
+}
+
+__all__ = ['STOPPED_TOKEN'] + sorted(_LAZY_ATTRIBUTES)
+
+
+def __getattr__(name):
+    module = _LAZY_ATTRIBUTES.get(name)
+    if module is None:
+        raise AttributeError("module %r has no attribute %r" % (__name__,
+                                                                name))
+    from importlib import import_module
+    value = getattr(import_module('.' + module, __name__), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(_LAZY_ATTRIBUTES))
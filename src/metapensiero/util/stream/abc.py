@@ -36,3 +36,25 @@ class Pluggable(abc.ABC):
     @abc.abstractmethod
     def _add_plugged(self, other):
         """Per class implementation of the plug behavior"""
+
+
+class Checkpointable(abc.ABC):
+    """An ABC useful to recognize the sources that can tell how far they
+    got with their `offset` attribute and that can restart from a
+    given offset with their ``resume()`` method. The classes that
+    don't inherit from it are recognized if they define both, with a
+    default `offset` at the class level or in ``__slots__``."""
+
+    @abc.abstractmethod
+    def resume(self, offset):
+        """Set the position where the next iteration starts."""
+
+    @classmethod
+    def __subclasshook__(cls, C):
+        if cls is Checkpointable:
+            attrs = set()
+            for B in C.__mro__:
+                attrs.update(B.__dict__)
+            if {'offset', 'resume'} <= attrs:
+                return True
+        return NotImplemented
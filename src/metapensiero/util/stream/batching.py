@@ -0,0 +1,192 @@
+# -*- coding: utf-8 -*-
+# :Project:   metapensiero.util.stream -- adaptive micro-batching
+# :Created:   lun 19 ott 2026 22:12:27 CEST
+# :Author:    Alberto Berti <alberto@metapensiero.it>
+# :License:   GNU General Public License version 3 or later
+# :Copyright: © 2026 Alberto Berti
+#
+
+import asyncio
+import collections
+
+from .prefetch import Prefetcher
+from .single import SingleSourced
+
+
+class AdaptiveBatching:
+    """A controller that decides the size of the batches and how long to
+    wait for a batch to fill (the *linger* time), looking at the
+    latency of the values and at the length of the queue.
+
+    Each time a batch is processed, `.record()`:meth: has to be called
+    with its latency, that is the time elapsed from the arrival of its
+    oldest value to the end of its processing. When the 99th
+    percentile of the recent latencies exceeds `target_latency`, size
+    and linger time are halved. When it is well below the target and
+    values are queueing up, the size grows; when instead the batches
+    are not filled, the linger time grows.
+
+    :param float target_latency: the desired 99th percentile of the
+      latency, in seconds
+    :param int min_size: the minimum size of a batch
+    :param int max_size: the maximum size of a batch
+    :param float min_linger: the minimum linger time, in seconds
+    :param float max_linger: the maximum linger time, in seconds
+    :param int window: the number of batches considered to compute the
+      latency percentile
+    """
+
+    def __init__(self, target_latency, *, min_size=1, max_size=1024,
+                 min_linger=0.0, max_linger=0.05, window=100):
+        if target_latency <= 0:
+            raise ValueError("target_latency must be a positive number")
+        if not 1 <= min_size <= max_size:
+            raise ValueError("Invalid batch size bounds")
+        if not 0 <= min_linger <= max_linger:
+            raise ValueError("Invalid linger time bounds")
+        self.target_latency = target_latency
+        self.min_size = min_size
+        self.max_size = max_size
+        self.min_linger = min_linger
+        self.max_linger = max_linger
+        self.size = min_size
+        self.linger = min_linger
+        self.batches = 0
+        self.queue_depth = 0
+        self._latencies = collections.deque(maxlen=window)
+
+    @property
+    def p99(self):
+        """The 99th percentile of the recent latencies."""
+        latencies = sorted(self._latencies)
+        if not latencies:
+            return 0.0
+        return latencies[int(0.99 * (len(latencies) - 1))]
+
+    def record(self, size, latency, queue_depth):
+        """Record a processed batch and adapt the parameters.
+
+        :param int size: the number of values in the batch
+        :param float latency: the latency of its oldest value, in seconds
+        :param int queue_depth: the number of values still waiting
+        """
+        self.batches += 1
+        self.queue_depth = queue_depth
+        self._latencies.append(latency)
+        p99 = self.p99
+        if p99 > self.target_latency:
+            self.size = max(self.min_size, self.size // 2)
+            self.linger = max(self.min_linger, self.linger / 2)
+            # forget the latencies measured with the old parameters
+            self._latencies.clear()
+        elif p99 < self.target_latency * 0.8:
+            if queue_depth >= self.size:
+                self.size = min(self.max_size, self.size + max(1, self.size
+                                                               // 4))
+            elif size < self.size:
+                step = (self.max_linger - self.min_linger) / 10
+                self.linger = min(self.max_linger, self.linger + step)
+
+    @property
+    def stats(self):
+        """A dictionary with the current decisions of the controller."""
+        return {'size': self.size, 'linger': self.linger, 'p99': self.p99,
+                'batches': self.batches, 'queue_depth': self.queue_depth}
+
+
+class Batcher(SingleSourced):
+    """A stage that groups the values of its source into lists, whose size
+    is decided by an `AdaptiveBatching`:class: controller.
+
+    The source is consumed by a separate task, so that the values keep
+    arriving while a batch is processed downstream. The time spent by
+    each batch downstream, which is the time between it's yielded and
+    the next one is requested, is accounted in its latency. This makes
+    the stage usable in front of a `~.dest.Destination`:class:, as the
+    source of a `~.transformer.Transformer`:class: or by a consumer
+    of a `~.tee.Tee`:class:.
+
+    Values sent with ``.asend()`` are ignored.
+
+    :param source: an *async iterable* or a *callable* returning an *async
+      generator* when called with no arguments
+    :param controller: an `AdaptiveBatching`:class: instance
+    :param int max_pending: the maximum number of values waiting, by
+      default four times the maximum batch size
+    :param loop: The optional loop.
+    :type loop: `asyncio.BaseEventLoop`
+    """
+
+    buffering = True
+
+    def __init__(self, source=None, *, controller, max_pending=None,
+                 loop=None):
+        self._agen = None
+        self._prefetcher = None
+        super().__init__(source)
+        self.loop = loop or asyncio.get_event_loop()
+        self.controller = controller
+        self.max_pending = max_pending or controller.max_size * 4
+
+    def __aiter__(self):
+        self.check_source()
+        if self._agen is not None:
+            raise RuntimeError("Already itered on")
+        self._agen = self._gen()
+        return self._agen
+
+    async def _gen(self):
+        loop = self.loop
+        controller = self.controller
+        prefetcher = self._prefetcher = Prefetcher(
+            self.get_source_agen(), self.max_pending,
+            convert=lambda value: (loop.time(), value), loop=loop)
+        pending = prefetcher.pending
+        lingered = False
+        try:
+            while True:
+                size = controller.size
+                if pending and (prefetcher.done or lingered or
+                                len(pending) >= size or
+                                loop.time() - pending[0][0] >=
+                                controller.linger):
+                    lingered = False
+                    values = prefetcher.take(size)
+                    first = values[0][0]
+                    yield [value for _, value in values]
+                    controller.record(len(values), loop.time() - first,
+                                      len(pending))
+                elif prefetcher.done:
+                    break
+                elif pending:
+                    # don't compare the times again when the timeout
+                    # expires, the rounding may make them disagree
+                    timeout = (pending[0][0] + controller.linger -
+                               loop.time())
+                    try:
+                        await asyncio.wait_for(prefetcher.wait(), timeout,
+                                               loop=loop)
+                    except asyncio.TimeoutError:
+                        lingered = True
+                else:
+                    await prefetcher.wait()
+            # raise the exception of the source, if any
+            await prefetcher.result()
+        finally:
+            await prefetcher.close()
+            self._prefetcher = None
+            self._agen = None
+
+    @property
+    def active(self):
+        return self._agen is not None
+
+    @property
+    def pulling(self):
+        prefetcher = self._prefetcher
+        return prefetcher is not None and prefetcher.idle
+
+    @property
+    def stats(self):
+        """The current decisions of the controller."""
+        return self.controller.stats
@@ -0,0 +1,160 @@
+# -*- coding: utf-8 -*-
+# :Project:   metapensiero.util.stream -- adapter for blocking sources
+# :Created:   mar 20 ott 2026 01:31:09 CEST
+# :Author:    Alberto Berti <alberto@metapensiero.it>
+# :License:   GNU General Public License version 3 or later
+# :Copyright: © 2026 Alberto Berti
+#
+
+import asyncio
+import collections
+import itertools
+import threading
+
+
+class BlockingSource:
+    """An async iterable that pulls the values from a synchronous iterable
+    or from a blocking function on a worker thread, so that the loop is
+    never blocked by the source.
+
+    The values are read in chunks of `chunk_size` and up to
+    `max_chunks` chunks are read ahead, so the reading overlaps with
+    the processing of the values already read. When the buffer is full
+    the worker waits, so the memory used is bounded.
+
+    Each iteration starts a new read: `source` can be an iterable or a
+    callable returning one, for example a function that opens a file.
+    Instead of `source`, `fetch` can be given: it's a callable
+    returning a sequence of values each time it's called, and an empty
+    one at the end, like the ``fetchmany()`` method of a DB-API cursor.
+
+    When the iteration is interrupted the worker is stopped after the
+    chunk it's reading. When the source raises an error, the values
+    read before it are yielded and then the error is raised by the
+    iteration. Each iteration uses a thread of `executor`, the
+    default one of the loop if it's not given, for all its duration.
+
+    :param source: an iterable or a callable returning one
+    :param fetch: a callable returning a chunk of values
+    :param int chunk_size: the number of values read at once from
+      `source`
+    :param int max_chunks: the maximum number of chunks read ahead
+    :param executor: an optional `concurrent.futures.Executor`
+    :param loop: The optional loop.
+    :type loop: `asyncio.BaseEventLoop`
+    """
+
+    _END = object()
+
+    def __init__(self, source=None, *, fetch=None, chunk_size=64,
+                 max_chunks=4, executor=None, loop=None):
+        if (source is None) == (fetch is None):
+            raise ValueError("Either source or fetch must be given")
+        if chunk_size < 1 or max_chunks < 1:
+            raise ValueError("chunk_size and max_chunks must be positive"
+                             " integers")
+        self.loop = loop or asyncio.get_event_loop()
+        self.source = source
+        self.fetch = fetch
+        self.chunk_size = chunk_size
+        self.max_chunks = max_chunks
+        self.executor = executor
+        self.chunks = 0
+        self.values = 0
+        self.stalls = 0
+
+    def __aiter__(self):
+        return self._gen()
+
+    def _chunks(self):
+        """Return a function that reads the next chunk into the given
+        list, in the worker."""
+        if self.fetch is not None:
+            fetch = self.fetch
+
+            def read(chunk):
+                chunk.extend(fetch())
+
+            return read
+        source = self.source
+        if callable(source) and not hasattr(source, '__iter__'):
+            source = source()
+        iterator = iter(source)
+        chunk_size = self.chunk_size
+
+        def read(chunk):
+            # the values read before an error are kept in the chunk
+            chunk.extend(itertools.islice(iterator, chunk_size))
+
+        return read
+
+    def _produce(self, buffer, room, stop, notify):
+        """The body of the worker."""
+        try:
+            read = self._chunks()
+            while not stop.is_set():
+                chunk = []
+                error = None
+                try:
+                    read(chunk)
+                except Exception as e:
+                    error = e
+                if chunk:
+                    room.acquire()
+                    if stop.is_set():
+                        break
+                    buffer.append(chunk)
+                    notify()
+                if error is not None:
+                    raise error
+                if not chunk:
+                    break
+        except BaseException as e:
+            buffer.append(e)
+        finally:
+            buffer.append(self._END)
+            notify()
+
+    async def _gen(self):
+        loop = self.loop
+        buffer = collections.deque()
+        room = threading.Semaphore(self.max_chunks)
+        stop = threading.Event()
+        avail = asyncio.Event(loop=loop)
+
+        def notify():
+            loop.call_soon_threadsafe(avail.set)
+
+        worker = loop.run_in_executor(self.executor, self._produce, buffer,
+                                      room, stop, notify)
+        try:
+            while True:
+                if buffer:
+                    chunk = buffer.popleft()
+                    if chunk is self._END:
+                        break
+                    if isinstance(chunk, BaseException):
+                        raise chunk
+                    room.release()
+                    self.chunks += 1
+                    self.values += len(chunk)
+                    for value in chunk:
+                        yield value
+                else:
+                    # the worker appends before notifying, so a value
+                    # appended after the check wakes up the wait below
+                    self.stalls += 1
+                    avail.clear()
+                    await avail.wait()
+        finally:
+            stop.set()
+            # unblock the worker if it's waiting for room
+            room.release()
+            await asyncio.wait([worker], loop=loop)
+
+    @property
+    def stats(self):
+        """A dictionary with the number of chunks and values read and of
+        the times the consumer had to wait for the worker."""
+        return {'chunks': self.chunks, 'values': self.values,
+                'stalls': self.stalls}
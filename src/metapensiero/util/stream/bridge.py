@@ -0,0 +1,213 @@
+# -*- coding: utf-8 -*-
+# :Project:   metapensiero.util.stream -- inter-process bridge
+# :Created:   lun 19 ott 2026 21:37:05 CEST
+# :Author:    Alberto Berti <alberto@metapensiero.it>
+# :License:   GNU General Public License version 3 or later
+# :Copyright: © 2026 Alberto Berti
+#
+
+import asyncio
+import logging
+
+from .framing import FrameDecoder, encode_frames, get_codec
+from .prefetch import Prefetcher
+
+
+logger = logging.getLogger(__name__)
+
+READ_SIZE = 256 * 1024
+
+
+async def _wait_eof(reader):
+    """Read and discard everything until the end of the stream."""
+    while await reader.read(READ_SIZE):
+        pass
+
+
+async def write_stream(source, writer, codec=None, *, max_batch=1024,
+                       reader=None, loop=None):
+    """Consume `source` and write its values to `writer`, each in a
+    length-prefixed frame.
+
+    The values are pulled by a separate task and collected while the
+    previous ones are being written, so that many small values end up
+    in a single write. When the writer's buffer is full, at most
+    `max_batch` values are collected before pulling from the source
+    is suspended, carrying the backpressure upstream.
+
+    With the `reader` of the same connection, a peer that disconnects
+    while the source has no values is noticed right away, raising
+    `ConnectionResetError`, instead of when the next value is written.
+
+    :param source: an *async iterable* or a *callable* returning an
+      *async generator*
+    :param writer: an `asyncio.StreamWriter`
+    :param codec: a codec instance or name, by default ``pickle``
+    :param int max_batch: the maximum number of values written at once
+    :param reader: an optional `asyncio.StreamReader`
+    """
+    loop = loop or asyncio.get_event_loop()
+    if hasattr(source, '__aiter__'):
+        agen = source.__aiter__()
+    else:
+        agen = source()
+    prefetcher = Prefetcher(agen, max_batch, convert=get_codec(codec).dumps,
+                            loop=loop)
+    if reader is not None:
+        eof_fut = asyncio.ensure_future(_wait_eof(reader), loop=loop)
+        eof_fut.add_done_callback(lambda fut: prefetcher.wake())
+    else:
+        eof_fut = None
+    try:
+        while True:
+            if prefetcher.pending:
+                writer.write(encode_frames(prefetcher.take(max_batch)))
+                await writer.drain()
+            elif prefetcher.done:
+                break
+            elif eof_fut is not None and eof_fut.done():
+                raise ConnectionResetError("The peer disconnected")
+            else:
+                await prefetcher.wait()
+        # raise the exception of the source, if any
+        await prefetcher.result()
+    finally:
+        if eof_fut is not None:
+            eof_fut.cancel()
+        await prefetcher.close()
+
+
+async def read_stream(reader, codec=None, *, max_size=None):
+    """An async generator that reads the frames written by
+    :func:`write_stream` from `reader` and yields the decoded values.
+
+    :param reader: an `asyncio.StreamReader`
+    :param codec: a codec instance or name, by default ``pickle``
+    :param int max_size: the optional maximum size of a frame
+    """
+    loads = get_codec(codec).loads
+    decoder = FrameDecoder() if max_size is None else FrameDecoder(max_size)
+    while True:
+        data = await reader.read(READ_SIZE)
+        if not data:
+            break
+        for payload in decoder.feed(data):
+            yield loads(payload)
+    if decoder.pending:
+        raise asyncio.IncompleteReadError(b'', None)
+
+
+async def open_pipe_reader(pipe, *, loop=None):
+    """Return an `asyncio.StreamReader` reading from the file object
+    `pipe`, to be used with :func:`read_stream`."""
+    loop = loop or asyncio.get_event_loop()
+    reader = asyncio.StreamReader(loop=loop)
+    protocol = asyncio.StreamReaderProtocol(reader, loop=loop)
+    await loop.connect_read_pipe(lambda: protocol, pipe)
+    return reader
+
+
+async def open_pipe_writer(pipe, *, loop=None):
+    """Return an `asyncio.StreamWriter` writing to the file object `pipe`,
+    to be used with :func:`write_stream`."""
+    loop = loop or asyncio.get_event_loop()
+    transport, protocol = await loop.connect_write_pipe(
+        lambda: asyncio.StreamReaderProtocol(asyncio.StreamReader(loop=loop),
+                                             loop=loop),
+        pipe)
+    return asyncio.StreamWriter(transport, protocol, None, loop)
+
+
+class BridgeServer:
+    """Serve the values of a source to other processes over a Unix domain
+    socket. Every client that connects starts a new iteration over the
+    source, so it's meant to be used with a `~.tee.Tee`:class:, where
+    each client becomes a consumer.
+
+    It can be used as an *async context manager*.
+
+    :param source: an *async iterable* or a *callable* returning an
+      *async generator*
+    :param str path: the path of the socket
+    :param codec: a codec instance or name, by default ``pickle``
+    :param int max_batch: the maximum number of values written at once
+    :param loop: The optional loop.
+    :type loop: `asyncio.BaseEventLoop`
+    """
+
+    def __init__(self, source, path, *, codec=None, max_batch=1024,
+                 loop=None):
+        self.loop = loop or asyncio.get_event_loop()
+        self.source = source
+        self.path = path
+        self.codec = get_codec(codec)
+        self.max_batch = max_batch
+        self._server = None
+        self._clients = set()
+
+    async def __aenter__(self):
+        await self.start()
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.close()
+
+    async def _handle(self, reader, writer):
+        task = asyncio.current_task(loop=self.loop)
+        self._clients.add(task)
+        try:
+            await write_stream(self.source, writer, self.codec,
+                               max_batch=self.max_batch, reader=reader,
+                               loop=self.loop)
+        except (ConnectionError, asyncio.CancelledError):
+            pass
+        except Exception:
+            logger.exception('Error serving %s', self.path)
+        finally:
+            self._clients.discard(task)
+            writer.close()
+
+    async def close(self):
+        """Stop accepting clients and disconnect the connected ones."""
+        if self._server is not None:
+            self._server.close()
+            for task in list(self._clients):
+                task.cancel()
+            await self._server.wait_closed()
+            self._server = None
+
+    async def start(self):
+        """Start listening on the socket."""
+        if self._server is not None:
+            raise RuntimeError("Already started")
+        self._server = await asyncio.start_unix_server(
+            self._handle, path=self.path, loop=self.loop)
+
+
+class BridgeSource:
+    """An async iterable that receives the values served by a
+    `BridgeServer`:class:. Each iteration opens a new connection, so it
+    can be used as the source of any stage.
+
+    :param str path: the path of the socket
+    :param codec: a codec instance or name, by default ``pickle``
+    :param loop: The optional loop.
+    :type loop: `asyncio.BaseEventLoop`
+    """
+
+    def __init__(self, path, *, codec=None, loop=None):
+        self.loop = loop or asyncio.get_event_loop()
+        self.path = path
+        self.codec = get_codec(codec)
+
+    def __aiter__(self):
+        return self._gen()
+
+    async def _gen(self):
+        reader, writer = await asyncio.open_unix_connection(self.path,
+                                                            loop=self.loop)
+        try:
+            async for value in read_stream(reader, self.codec):
+                yield value
+        finally:
+            writer.close()
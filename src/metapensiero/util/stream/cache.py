@@ -0,0 +1,439 @@
+# -*- coding: utf-8 -*-
+# :Project:   metapensiero.util.stream -- bounded key indexes and caches
+# :Created:   lun 19 ott 2026 10:12:31 CEST
+# :Author:    Alberto Berti <alberto@metapensiero.it>
+# :License:   GNU General Public License version 3 or later
+# :Copyright: © 2026 Alberto Berti
+#
+
+import abc
+import asyncio
+import collections
+import hashlib
+import math
+import time
+
+from .abc import ExecPossibleAwaitable
+
+
+MISSING = object()
+
+
+class BoundedIndex(abc.ABC):
+    """An ABC for a set of keys whose memory usage doesn't grow past a
+    fixed limit. It keeps ``hits`` and ``misses`` counters updated by
+    `.seen()`:meth:."""
+
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+
+    @abc.abstractmethod
+    def __contains__(self, key):
+        """Membership test, doesn't update the counters."""
+
+    @abc.abstractmethod
+    def __len__(self):
+        """The number of keys currently tracked."""
+
+    @abc.abstractmethod
+    def add(self, key):
+        """Add a key to the index, possibly evicting older keys."""
+
+    @abc.abstractmethod
+    def clear(self):
+        """Forget every key."""
+
+    def seen(self, key):
+        """Check if `key` has been seen already and record it. Returns
+        ``True`` if it was already present."""
+        if key in self:
+            self.hits += 1
+            return True
+        self.misses += 1
+        self.add(key)
+        return False
+
+    @property
+    def stats(self):
+        """A dictionary with the counters of the index."""
+        return {'hits': self.hits, 'misses': self.misses, 'size': len(self)}
+
+
+class LRUIndex(BoundedIndex):
+    """An index that keeps at most `maxsize` keys, evicting the least
+    recently seen ones.
+
+    :param int maxsize: the maximum number of keys
+    """
+
+    def __init__(self, maxsize=1024):
+        super().__init__()
+        if maxsize < 1:
+            raise ValueError("maxsize must be a positive integer")
+        self.maxsize = maxsize
+        self._keys = collections.OrderedDict()
+
+    def __contains__(self, key):
+        return key in self._keys
+
+    def __len__(self):
+        return len(self._keys)
+
+    def add(self, key):
+        keys = self._keys
+        keys[key] = None
+        keys.move_to_end(key)
+        if len(keys) > self.maxsize:
+            keys.popitem(last=False)
+
+    def clear(self):
+        self._keys.clear()
+
+    def seen(self, key):
+        keys = self._keys
+        if key in keys:
+            keys.move_to_end(key)
+            self.hits += 1
+            return True
+        self.misses += 1
+        self.add(key)
+        return False
+
+
+class TTLIndex(BoundedIndex):
+    """An index whose keys are forgotten `ttl` seconds after they have
+    been added. The number of keys is also capped by `maxsize`, so
+    that a burst of distinct keys cannot make it grow unbounded.
+
+    :param float ttl: the time to live of each key, in seconds
+    :param int maxsize: the maximum number of keys
+    :param clock: an optional callable returning the current time in
+      seconds, defaults to `time.monotonic`
+    """
+
+    def __init__(self, ttl, maxsize=1024, clock=None):
+        super().__init__()
+        if ttl <= 0:
+            raise ValueError("ttl must be a positive number")
+        if maxsize < 1:
+            raise ValueError("maxsize must be a positive integer")
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self.clock = clock or time.monotonic
+        self._keys = collections.OrderedDict()
+
+    def __contains__(self, key):
+        expiry = self._keys.get(key)
+        return expiry is not None and expiry > self.clock()
+
+    def __len__(self):
+        self.expire()
+        return len(self._keys)
+
+    def add(self, key):
+        keys = self._keys
+        now = self.clock()
+        self.expire(now)
+        keys.pop(key, None)
+        keys[key] = now + self.ttl
+        if len(keys) > self.maxsize:
+            keys.popitem(last=False)
+
+    def clear(self):
+        self._keys.clear()
+
+    def expire(self, now=None):
+        """Drop the expired keys. Since every key has the same ttl, they
+        are kept in expiration order and only the head needs checking."""
+        if now is None:
+            now = self.clock()
+        keys = self._keys
+        while keys:
+            key, expiry = next(iter(keys.items()))
+            if expiry > now:
+                break
+            del keys[key]
+
+
+class BloomIndex(BoundedIndex):
+    """A probabilistic index for very large key spaces. It may report a
+    key as already seen when it is not (with a rate close to
+    `error_rate`) but never the opposite.
+
+    To keep the error rate bounded on endless streams, two filters are
+    kept: when the current one has received `capacity` keys it becomes
+    the previous one and a fresh filter takes its place. The memory
+    used is fixed and is exposed as `nbytes`.
+
+    The keys must be :class:`bytes`, :class:`str` or have a stable
+    `repr()`.
+
+    :param int capacity: the number of keys per generation
+    :param float error_rate: the desired false positives rate
+    """
+
+    def __init__(self, capacity=100000, error_rate=0.001):
+        super().__init__()
+        if capacity < 1:
+            raise ValueError("capacity must be a positive integer")
+        if not 0 < error_rate < 1:
+            raise ValueError("error_rate must be between 0 and 1")
+        self.capacity = capacity
+        self.error_rate = error_rate
+        nbits = math.ceil(-capacity * math.log(error_rate) /
+                          (math.log(2) ** 2))
+        self._nbytes = (nbits + 7) // 8
+        self._nbits = self._nbytes * 8
+        self._nhashes = max(1, round(self._nbits / capacity * math.log(2)))
+        self._current = bytearray(self._nbytes)
+        self._previous = bytearray(self._nbytes)
+        self._count = 0
+
+    def __contains__(self, key):
+        positions = self._positions(key)
+        return (self._test(self._current, positions) or
+                self._test(self._previous, positions))
+
+    def __len__(self):
+        return self._count
+
+    def _positions(self, key):
+        if isinstance(key, str):
+            key = key.encode('utf-8')
+        elif not isinstance(key, (bytes, bytearray)):
+            key = repr(key).encode('utf-8')
+        digest = hashlib.blake2b(key, digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], 'little')
+        h2 = int.from_bytes(digest[8:], 'little') | 1
+        nbits = self._nbits
+        return [(h1 + i * h2) % nbits for i in range(self._nhashes)]
+
+    @staticmethod
+    def _test(bits, positions):
+        for pos in positions:
+            if not bits[pos >> 3] & (1 << (pos & 7)):
+                return False
+        return True
+
+    def add(self, key):
+        self._add(self._positions(key))
+
+    def _add(self, positions):
+        if self._count >= self.capacity:
+            self._previous, self._current = self._current, self._previous
+            self._current[:] = bytes(self._nbytes)
+            self._count = 0
+        bits = self._current
+        for pos in positions:
+            bits[pos >> 3] |= 1 << (pos & 7)
+        self._count += 1
+
+    def clear(self):
+        self._current[:] = bytes(self._nbytes)
+        self._previous[:] = bytes(self._nbytes)
+        self._count = 0
+
+    @property
+    def nbytes(self):
+        """The memory used by the filters, in bytes."""
+        return self._nbytes * 2
+
+    def seen(self, key):
+        positions = self._positions(key)
+        if (self._test(self._current, positions) or
+            self._test(self._previous, positions)):
+            self.hits += 1
+            return True
+        self.misses += 1
+        self._add(positions)
+        return False
+
+
+class BoundedCache(ExecPossibleAwaitable):
+    """An ABC for a mapping whose size doesn't grow past a fixed limit,
+    used to memoize the results of (possibly asynchronous) functions.
+
+    It keeps ``hits`` and ``misses`` counters updated by `.get()`:meth:.
+    `.fetch()`:meth: counts each lookup once, either as a hit, as a miss
+    or, when it waits for an already running computation, in the
+    ``coalesced`` counter. The hit rate counts the coalesced lookups as
+    hits, since they don't start a computation.
+    """
+
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self._pending = {}
+
+    @abc.abstractmethod
+    def __len__(self):
+        """The number of entries currently cached."""
+
+    @abc.abstractmethod
+    def _get(self, key):
+        """Return the value cached for `key` or `MISSING`."""
+
+    @abc.abstractmethod
+    def clear(self):
+        """Forget every entry."""
+
+    @abc.abstractmethod
+    def set(self, key, value):
+        """Cache `value` under `key`, possibly evicting older entries."""
+
+    async def fetch(self, key, func, *args, **kwargs):
+        """Return the value cached under `key`. If it's missing, it's
+        computed by calling `func` with the given arguments and
+        awaiting the result if needed. While the computation runs, any
+        other request for the same key waits for its result instead of
+        starting a new one. If the computation is cancelled, one of the
+        waiting requests starts it again."""
+        value = self._get(key)
+        if value is not MISSING:
+            self.hits += 1
+            return value
+        if key in self._pending:
+            self.coalesced += 1
+        else:
+            self.misses += 1
+        while True:
+            pending = self._pending.get(key)
+            if pending is None:
+                break
+            value = await asyncio.shield(pending)
+            if value is not MISSING:
+                return value
+            # the computation was cancelled, someone may have completed
+            # it again meanwhile
+            value = self._get(key)
+            if value is not MISSING:
+                return value
+        pending = asyncio.get_event_loop().create_future()
+        self._pending[key] = pending
+        try:
+            value = await self._exec_possible_awaitable(func, *args, **kwargs)
+        except asyncio.CancelledError:
+            # don't cancel the waiters, they will compute it themselves
+            pending.set_result(MISSING)
+            raise
+        except Exception as e:
+            pending.set_exception(e)
+            # mark it as retrieved, the waiters will get it anyway
+            pending.exception()
+            raise
+        else:
+            self.set(key, value)
+            pending.set_result(value)
+        finally:
+            del self._pending[key]
+        return value
+
+    def get(self, key, default=None):
+        """Return the value cached under `key` or `default`."""
+        value = self._get(key)
+        if value is MISSING:
+            self.misses += 1
+            return default
+        self.hits += 1
+        return value
+
+    @property
+    def stats(self):
+        """A dictionary with the counters of the cache."""
+        served = self.hits + self.coalesced
+        lookups = served + self.misses
+        return {'hits': self.hits, 'misses': self.misses,
+                'coalesced': self.coalesced, 'size': len(self),
+                'hit_rate': served / lookups if lookups else 0.0}
+
+
+class LRUCache(BoundedCache):
+    """A cache that keeps at most `maxsize` entries, evicting the least
+    recently used ones.
+
+    :param int maxsize: the maximum number of entries
+    """
+
+    def __init__(self, maxsize=1024):
+        super().__init__()
+        if maxsize < 1:
+            raise ValueError("maxsize must be a positive integer")
+        self.maxsize = maxsize
+        self._data = collections.OrderedDict()
+
+    def __len__(self):
+        return len(self._data)
+
+    def _get(self, key):
+        data = self._data
+        value = data.get(key, MISSING)
+        if value is not MISSING:
+            data.move_to_end(key)
+        return value
+
+    def clear(self):
+        self._data.clear()
+
+    def set(self, key, value):
+        data = self._data
+        data[key] = value
+        data.move_to_end(key)
+        if len(data) > self.maxsize:
+            data.popitem(last=False)
+
+
+class TTLCache(BoundedCache):
+    """A cache whose entries expire `ttl` seconds after they have been
+    set. The number of entries is also capped by `maxsize`.
+
+    :param float ttl: the time to live of each entry, in seconds
+    :param int maxsize: the maximum number of entries
+    :param clock: an optional callable returning the current time in
+      seconds, defaults to `time.monotonic`
+    """
+
+    def __init__(self, ttl, maxsize=1024, clock=None):
+        super().__init__()
+        if ttl <= 0:
+            raise ValueError("ttl must be a positive number")
+        if maxsize < 1:
+            raise ValueError("maxsize must be a positive integer")
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self.clock = clock or time.monotonic
+        self._data = collections.OrderedDict()
+
+    def __len__(self):
+        self.expire()
+        return len(self._data)
+
+    def _get(self, key):
+        entry = self._data.get(key)
+        if entry is None or entry[0] <= self.clock():
+            return MISSING
+        return entry[1]
+
+    def clear(self):
+        self._data.clear()
+
+    def expire(self, now=None):
+        """Drop the expired entries."""
+        if now is None:
+            now = self.clock()
+        data = self._data
+        while data:
+            key, (expiry, value) = next(iter(data.items()))
+            if expiry > now:
+                break
+            del data[key]
+
+    def set(self, key, value):
+        data = self._data
+        now = self.clock()
+        self.expire(now)
+        data.pop(key, None)
+        data[key] = (now + self.ttl, value)
+        if len(data) > self.maxsize:
+            data.popitem(last=False)
@@ -0,0 +1,104 @@
+# -*- coding: utf-8 -*-
+# :Project:   metapensiero.util.stream -- checkpoint stores
+# :Created:   mar 20 ott 2026 03:05:22 CEST
+# :Author:    Alberto Berti <alberto@metapensiero.it>
+# :License:   GNU General Public License version 3 or later
+# :Copyright: © 2026 Alberto Berti
+#
+
+import abc
+import json
+import os
+import re
+import sqlite3
+
+
+class CheckpointStore(abc.ABC):
+    """Base class of the stores where a `~.dest.Destination`:class:
+    records the offset of the last value it has processed, under a
+    name. The offsets can be any value that can be encoded in JSON.
+
+    The methods are synchronous and are called in the loop, each save
+    waits for the data to reach the disk and blocks the loop meanwhile,
+    usually for some milliseconds. Its cost is amortized with the
+    ``checkpoint_every`` parameter of the destination.
+    """
+
+    @abc.abstractmethod
+    def load(self, name):
+        """Return the offset saved under `name` or ``None``."""
+
+    @abc.abstractmethod
+    def save(self, name, offset):
+        """Save `offset` under `name`, durably."""
+
+    def close(self):
+        """Release the resources used by the store."""
+
+
+class FileCheckpointStore(CheckpointStore):
+    """Store the offsets in a JSON file. Each save rewrites the file
+    atomically, so a crash leaves either the old or the new content.
+
+    :param str path: the path of the file
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._offsets = None
+
+    def _read(self):
+        if self._offsets is None:
+            try:
+                with open(self.path) as f:
+                    self._offsets = json.load(f)
+            except FileNotFoundError:
+                self._offsets = {}
+        return self._offsets
+
+    def load(self, name):
+        return self._read().get(name)
+
+    def save(self, name, offset):
+        offsets = self._read()
+        offsets[name] = offset
+        temp = self.path + '.tmp'
+        with open(temp, 'w') as f:
+            json.dump(offsets, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp, self.path)
+
+
+class SQLiteCheckpointStore(CheckpointStore):
+    """Store the offsets in a table of a SQLite database.
+
+    :param str path: the path of the database
+    :param str table: the name of the table, created if missing
+    """
+
+    _identifier = re.compile(r'[A-Za-z_][A-Za-z0-9_]*$')
+
+    def __init__(self, path, *, table='checkpoints'):
+        if not self._identifier.match(table):
+            raise ValueError("Invalid table name: %r" % table)
+        self.path = path
+        self.table = table
+        self._db = sqlite3.connect(path)
+        with self._db:
+            self._db.execute('CREATE TABLE IF NOT EXISTS %s (name TEXT'
+                             ' PRIMARY KEY, position TEXT)' % table)
+
+    def close(self):
+        self._db.close()
+
+    def load(self, name):
+        row = self._db.execute('SELECT position FROM %s WHERE name = ?'
+                               % self.table, (name,)).fetchone()
+        return None if row is None else json.loads(row[0])
+
+    def save(self, name, offset):
+        with self._db:
+            self._db.execute('INSERT OR REPLACE INTO %s (name, position)'
+                             ' VALUES (?, ?)' % self.table,
+                             (name, json.dumps(offset)))
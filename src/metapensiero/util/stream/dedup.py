@@ -0,0 +1,74 @@
+# -*- coding: utf-8 -*-
+# :Project:   metapensiero.util.stream -- Deduplicator class
+# :Created:   lun 19 ott 2026 10:41:07 CEST
+# :Author:    Alberto Berti <alberto@metapensiero.it>
+# :License:   GNU General Public License version 3 or later
+# :Copyright: © 2026 Alberto Berti
+#
+
+import asyncio
+
+from .cache import LRUIndex
+from .single import SingleSourced
+
+
+class Deduplicator(SingleSourced):
+    """A stage that drops the values of a stream that have been seen
+    already. The values are compared using a key extracted by the
+    `key` function and the keys are remembered by a
+    `~.cache.BoundedIndex`:class:, so that the memory used doesn't
+    depend on the length of the stream.
+
+    Values sent with ``.asend()`` are forwarded to the source as they
+    are; the source receives ``None`` after a duplicate value.
+
+    :param source: an *async iterable* or a *callable* returning an *async
+      generator* when called with no arguments
+    :param key: an optional function to compute the key of each value,
+      by default the value itself is used
+    :param index: an optional `~.cache.BoundedIndex`:class: instance, by
+      default a `~.cache.LRUIndex`:class: with 1024 entries
+    """
+
+    def __init__(self, source=None, *, key=None, index=None):
+        self._agen = None
+        super().__init__(source)
+        self.key = key
+        self.index = LRUIndex() if index is None else index
+
+    def __aiter__(self):
+        self.check_source()
+        if self._agen is not None:
+            raise RuntimeError("Already itered on")
+        self._agen = self._gen(self.key, self.index)
+        return self._agen
+
+    async def _gen(self, key, index):
+        agen = self.get_source_agen()
+        send_value = None
+        try:
+            while True:
+                self.pulling = True
+                value = await agen.asend(send_value)
+                self.pulling = False
+                if index.seen(value if key is None else key(value)):
+                    send_value = None
+                else:
+                    send_value = yield value
+        except StopAsyncIteration:
+            pass
+        except asyncio.CancelledError:
+            pass
+        finally:
+            self.pulling = False
+            self._agen = None
+
+    @property
+    def active(self):
+        return self._agen is not None
+
+    @property
+    def stats(self):
+        """The counters of the index, ``hits`` being the number of
+        dropped duplicates."""
+        return self.index.stats
@@ -8,38 +8,160 @@
 
 import abc
 import asyncio
+import collections
 import contextlib
 import logging
 
-from .abc import ExecPossibleAwaitable
-from .single import SingleSourced
+from .abc import Checkpointable, ExecPossibleAwaitable
+from .single import SingleSourced, upstream_idle
 
 
 logger = logging.getLogger(__name__)
 
 
 class Destination(SingleSourced, ExecPossibleAwaitable):
+    """Base class of the stages that pull the values out of their source
+    in a task of their own.
 
-    def __init__(self, source=None):
+    With a `checkpoint` store, the offset of the processed values is
+    saved every `checkpoint_every` values and when the task ends. On
+    start the last saved offset is given to the first
+    `~.abc.Checkpointable`:class: source found going upstream, like a
+    `~.tail.FileTail`:class:, that resumes from there. By default the
+    offset is read from that source after each value is processed, so
+    there must be no stage that buffers values (one whose
+    ``buffering`` attribute is true, like a `~.tee.Tee`:class:) in
+    between, otherwise `checkpoint_offset` must compute the offset from
+    each value.
+
+    After a restart at most `checkpoint_every` values are processed
+    again, so the delivery is *at least once*. It is *exactly once*
+    when `_destination` is idempotent, or when it saves the offset
+    itself and `checkpoint_every` is ``1``.
+
+    With `concurrency` greater than one, up to that many calls to
+    `_destination` run at once, each in a task. The source isn't
+    suspended on the value being processed then, so the values they
+    return, when not ``None``, are sent back to it as ``(value,
+    answer)`` tuples, in the source order, each one with the first
+    value pulled after it's ready. The answers still to be sent when
+    the source ends are dropped. The offsets are acknowledged in the
+    source order too, so a checkpoint never skips a value still in
+    flight. `.stop()`:meth: waits for the values in flight.
+
+    :param source: an *async iterable* or a *callable* returning an *async
+      generator* when called with no arguments
+    :param tracer: an optional `~.tracing.Tracer`:class: that records the
+      processing time and the end to end latency of the sampled values
+    :param checkpoint: an optional `~.checkpoint.CheckpointStore`:class:
+    :param str checkpoint_name: the name of the offset in the store,
+      required with `checkpoint`
+    :param int checkpoint_every: the number of values processed between
+      the saves
+    :param checkpoint_offset: an optional function returning the offset
+      of a value
+    :param int concurrency: the maximum number of values processed at
+      once
+    """
+
+    def __init__(self, source=None, *, tracer=None, checkpoint=None,
+                 checkpoint_name=None, checkpoint_every=100,
+                 checkpoint_offset=None, concurrency=1):
         super().__init__(source)
+        if concurrency < 1:
+            raise ValueError("concurrency must be a positive integer")
+        self.concurrency = concurrency
         self._run_fut = None
+        self._draining = False
         self.started = None
+        self.tracer = tracer
+        if checkpoint is not None and checkpoint_name is None:
+            raise ValueError("A checkpoint_name is required")
+        if checkpoint_every < 1:
+            raise ValueError("checkpoint_every must be a positive integer")
+        self.checkpoint = checkpoint
+        self.checkpoint_name = checkpoint_name
+        self.checkpoint_every = checkpoint_every
+        self.checkpoint_offset = checkpoint_offset
+        self.offset = None
+        self._offset_source = None
+        self._unsaved = 0
+
+    def _acknowledge(self, offset):
+        """Record the offset of a processed value and save it if it's
+        time."""
+        self.offset = offset
+        self._unsaved += 1
+        if self._unsaved >= self.checkpoint_every:
+            self._save_checkpoint()
+
+    def _offset_of(self, value):
+        """Return the offset of a value just pulled from the source."""
+        if self.checkpoint_offset is None:
+            return self._offset_source.offset
+        return self.checkpoint_offset(value)
+
+    async def _process(self, value, trace):
+        """Process a value in its own task, used with `concurrency`."""
+        result = await self._destination(value)
+        if trace is not None:
+            self.tracer.mark(trace, 'destination.process')
+            self.tracer.finish(trace)
+        return result
+
+    def _resume_checkpoint(self):
+        """Load the saved offset and give it to the first checkpointable
+        source upstream."""
+        buffered = False
+        source = self.source
+        while not isinstance(source, Checkpointable):
+            if not isinstance(source, SingleSourced):
+                source = None
+                break
+            if source.buffering:
+                buffered = True
+            source = source.source
+        if self.checkpoint_offset is None and (source is None or buffered):
+            raise RuntimeError("Cannot read the offsets from the source, a"
+                               " checkpoint_offset function is needed")
+        self._offset_source = source
+        self.offset = self.checkpoint.load(self.checkpoint_name)
+        if self.offset is not None and source is not None:
+            source.resume(self.offset)
+
+    def _save_checkpoint(self):
+        if self._unsaved:
+            self.checkpoint.save(self.checkpoint_name, self.offset)
+            self._unsaved = 0
 
     @abc.abstractmethod
     async def _destination(self, element):
         """Do something with each value pulled by the source."""
 
-    async def _run(self):
+    async def _run(self, agen):
+        tracer = self.tracer
+        checkpoint = self.checkpoint
         send_value = None
         try:
-            agen = self.get_source_agen()
-            self.started.set_result(None)
-        except Exception as e:
-            self.started.set_exception(e)
-        try:
-            while True:
-                value = await agen.asend(send_value)
-                send_value = await self._destination(value)
+            if self.concurrency > 1:
+                await self._run_concurrent(agen)
+            else:
+                while not self._draining:
+                    self.pulling = True
+                    value = await agen.asend(send_value)
+                    self.pulling = False
+                    if tracer is not None:
+                        trace = tracer.take(value, agen)
+                        send_value = await self._destination(value)
+                        if trace is not None:
+                            tracer.mark(trace, 'destination.process')
+                            tracer.finish(trace)
+                    else:
+                        send_value = await self._destination(value)
+                    if checkpoint is not None:
+                        self._acknowledge(self._offset_of(value))
+            # stopped by drain()
+            await agen.aclose()
         except StopAsyncIteration:
             pass
         except asyncio.CancelledError:
@@ -49,15 +171,102 @@ class Destination(SingleSourced, ExecPossibleAwaitable):
             raise
         finally:
             self.active = False
+            self.pulling = False
+            if checkpoint is not None:
+                self._save_checkpoint()
+
+    async def _run_concurrent(self, agen):
+        """The loop of `_run` when many values are processed at once. It
+        ends raising the same exceptions."""
+        tracer = self.tracer
+        checkpoint = self.checkpoint
+        # the tasks in flight, with their values and offsets, in the
+        # source order
+        window = collections.deque()
+        answers = collections.deque()
+        ended = False
+
+        def complete():
+            """Collect the tasks completed at the head of the window."""
+            while window and window[0][0].done():
+                task, value, offset = window.popleft()
+                result = task.result()
+                if result is not None:
+                    answers.append((value, result))
+                if checkpoint is not None:
+                    self._acknowledge(offset)
+
+        try:
+            while True:
+                complete()
+                while len(window) >= self.concurrency:
+                    await asyncio.wait([window[0][0]])
+                    complete()
+                if self._draining:
+                    break
+                self.pulling = True
+                try:
+                    value = await agen.asend(answers.popleft() if answers
+                                             else None)
+                except StopAsyncIteration:
+                    ended = True
+                    break
+                self.pulling = False
+                offset = None if checkpoint is None else self._offset_of(
+                    value)
+                trace = None if tracer is None else tracer.take(value, agen)
+                window.append((asyncio.ensure_future(
+                    self._process(value, trace)), value, offset))
+            if window:
+                await asyncio.wait([task for task, _, _ in window])
+                complete()
+        except BaseException:
+            # complete the values in flight without masking the exception
+            if window:
+                await asyncio.wait([task for task, _, _ in window])
+                with contextlib.suppress(Exception):
+                    complete()
+                # retrieve the other errors, they are lost anyway
+                for task, _, _ in window:
+                    if not task.cancelled():
+                        task.exception()
+            raise
+        if ended:
+            raise StopAsyncIteration
+
+    def drain(self, stop_source=True):
+        """Let the task end gracefully and return its future, or ``None``
+        if it isn't running.
+
+        With `stop_source`, no more values are pulled after the ones
+        being processed, which are completed, then the source is
+        closed. If the stage is only waiting for a value from the source,
+        and so are the stages up to the external source, the wait is
+        cancelled since nothing is lost. Otherwise the task is left to
+        end with its source.
+        """
+        fut = self._run_fut
+        if fut is not None and stop_source and not fut.done():
+            self._draining = True
+            if self.pulling and upstream_idle(self.source):
+                fut.cancel()
+        return fut
 
     async def start(self):
+        """Start the task pulling from the source. The iteration of the
+        source begins before this returns, so a destination started
+        after this one doesn't see any value that this one misses."""
         self.check_source()
         if not self.active and not self._run_fut:
+            if self.checkpoint is not None:
+                self._resume_checkpoint()
+            agen = self.get_source_agen()
             self.active = True
+            self._draining = False
             loop = asyncio.get_event_loop()
             self.started = loop.create_future()
-            self._run_fut = asyncio.ensure_future(self._run())
-            await self.started
+            self.started.set_result(None)
+            self._run_fut = asyncio.ensure_future(self._run(agen))
 
     async def stop(self):
         if self.active and self._run_fut:
@@ -0,0 +1,81 @@
+# -*- coding: utf-8 -*-
+# :Project:   metapensiero.util.stream -- error signalling
+# :Created:   lun 19 ott 2026 16:58:40 CEST
+# :Author:    Alberto Berti <alberto@metapensiero.it>
+# :License:   GNU General Public License version 3 or later
+# :Copyright: © 2026 Alberto Berti
+#
+
+import collections.abc
+import enum
+import logging
+
+from .abc import ExecPossibleAwaitable
+
+
+logger = logging.getLogger(__name__)
+
+ERROR_POLICY = enum.IntEnum('ErrorPolicy', 'FAIL ISOLATE RETRY')
+"""What to do when a source raises an error:
+
+FAIL
+  deliver the error to the consumers, stopping the whole stream;
+ISOLATE
+  report the error on the side channel and stop only the failed
+  source, the others keep running;
+RETRY
+  report the error on the side channel and restart the failed source
+  after a delay; when the retries are exhausted or when the source
+  cannot be restarted, the error is handled as with ``FAIL``.
+"""
+
+
+def restartable(source):
+    """Tell if `source` can be iterated again after an error. An async
+    iterator, like an async generator object, returns itself when it's
+    iterated again, so only the callables and the other async iterables
+    can be restarted."""
+    return not isinstance(source, collections.abc.AsyncIterator)
+
+
+class StreamError:
+    """An envelope that carries an exception through the queues of the
+    stream classes alongside the values. Since it's a type of its own,
+    the consumers can tell it apart with an identity test on the class
+    of each element, without ever comparing the values themselves.
+
+    :param exc: the exception
+    :param source: the optional source that raised it
+    """
+
+    __slots__ = ('exc', 'source')
+
+    def __init__(self, exc, source=None):
+        self.exc = exc
+        self.source = source
+
+    def __repr__(self):
+        return '<%s %r from %r>' % (self.__class__.__name__, self.exc,
+                                     self.source)
+
+
+class ErrorReporter(ExecPossibleAwaitable):
+    """A *mixin* class for the stream classes that deliver the errors
+    handled by their `ERROR_POLICY`:data: on a side channel, which is
+    the ``on_error`` callable. It receives a `StreamError`:class: and
+    can return an awaitable. Without it, the errors are logged."""
+
+    on_error = None
+
+    def _retry_delay(self, attempt):
+        return self.retry_delay * 2 ** (attempt - 1)
+
+    async def _report_error(self, exc, source=None):
+        if self.on_error is not None:
+            try:
+                await self._exec_possible_awaitable(self.on_error,
+                                                    StreamError(exc, source))
+            except Exception:
+                logger.exception('Error in the on_error callback')
+        else:
+            logger.warning('Error in source %r', source, exc_info=exc)
@@ -0,0 +1,122 @@
+# -*- coding: utf-8 -*-
+# :Project:   metapensiero.util.stream -- length-prefixed framing and codecs
+# :Created:   lun 19 ott 2026 21:04:18 CEST
+# :Author:    Alberto Berti <alberto@metapensiero.it>
+# :License:   GNU General Public License version 3 or later
+# :Copyright: © 2026 Alberto Berti
+#
+
+import pickle
+import struct
+
+
+HEADER = struct.Struct('!I')
+"""The header of each frame: the length of the payload as an unsigned
+32 bits big-endian integer."""
+
+MAX_FRAME_SIZE = 64 * 1024 * 1024
+
+
+def encode_frames(payloads):
+    """Return a single buffer with the frames carrying `payloads`."""
+    pack = HEADER.pack
+    chunks = []
+    for payload in payloads:
+        chunks.append(pack(len(payload)))
+        chunks.append(payload)
+    return b''.join(chunks)
+
+
+class FrameDecoder:
+    """Split a stream of bytes fed in arbitrary chunks into the payloads of
+    its frames.
+
+    :param int max_size: the maximum size of a payload, bigger frames
+      are considered corrupted
+    """
+
+    def __init__(self, max_size=MAX_FRAME_SIZE):
+        self.max_size = max_size
+        self._buffer = bytearray()
+
+    def feed(self, data):
+        """Add `data` to the buffer and return a list with the payloads of
+        the frames that are complete."""
+        buffer = self._buffer
+        buffer += data
+        payloads = []
+        pos = 0
+        size = len(buffer)
+        header_size = HEADER.size
+        with memoryview(buffer) as view:
+            while size - pos >= header_size:
+                length = HEADER.unpack_from(view, pos)[0]
+                if length > self.max_size:
+                    raise ValueError("Frame too big: %d bytes" % length)
+                end = pos + header_size + length
+                if end > size:
+                    break
+                payloads.append(bytes(view[pos + header_size:end]))
+                pos = end
+        if pos:
+            del buffer[:pos]
+        return payloads
+
+    @property
+    def pending(self):
+        """The number of bytes of an incomplete frame."""
+        return len(self._buffer)
+
+
+class PickleCodec:
+    """Encode the values with `pickle`."""
+
+    name = 'pickle'
+
+    def __init__(self, protocol=pickle.HIGHEST_PROTOCOL):
+        self.protocol = protocol
+
+    def dumps(self, value):
+        return pickle.dumps(value, self.protocol)
+
+    def loads(self, payload):
+        return pickle.loads(payload)
+
+
+class MsgpackCodec:
+    """Encode the values with `msgpack`, which must be installed."""
+
+    name = 'msgpack'
+
+    def __init__(self, **options):
+        try:
+            import msgpack
+        except ImportError:
+            raise RuntimeError("The msgpack package is not installed")
+        self._msgpack = msgpack
+        self.options = dict(use_bin_type=True, **options)
+
+    def dumps(self, value):
+        return self._msgpack.packb(value, **self.options)
+
+    def loads(self, payload):
+        return self._msgpack.unpackb(payload, raw=False)
+
+
+CODECS = {
+    'pickle': PickleCodec,
+    'msgpack': MsgpackCodec,
+}
+
+
+def get_codec(codec=None):
+    """Return a codec instance given its name or the instance itself. By
+    default the pickle codec is used."""
+    if codec is None:
+        codec = 'pickle'
+    if isinstance(codec, str):
+        try:
+            codec = CODECS[codec]()
+        except KeyError:
+            raise ValueError("Unknown codec: %r" % codec)
+    return codec
@@ -0,0 +1,130 @@
+# -*- coding: utf-8 -*-
+# :Project:   metapensiero.util.stream -- ordered merge of sorted streams
+# :Created:   lun 19 ott 2026 12:05:48 CEST
+# :Author:    Alberto Berti <alberto@metapensiero.it>
+# :License:   GNU General Public License version 3 or later
+# :Copyright: © 2026 Alberto Berti
+#
+
+import asyncio
+import heapq
+import itertools
+
+from . import STOPPED_TOKEN
+from .selector import Selector, SELECTOR_STATUS
+from .tracing import Traced
+
+
+class MergeSelector(Selector):
+    """A `~.selector.Selector`:class: that merges sources whose values
+    are already ordered and yields them in global order, like
+    `heapq.merge()` does for synchronous iterables.
+
+    Each source is allowed to have only one value buffered (its
+    *head*), so the memory needed doesn't depend on how much the
+    sources are out of sync. The selector waits only for the sources
+    that have no head buffered and yields the smallest head as soon as
+    every running source has provided one.
+
+    A source that doesn't produce a value within `timeout` seconds is
+    considered stalled and the merge proceeds without it until it
+    provides a new value. Values arriving from a stalled source after
+    greater values have been yielded are yielded as soon as possible,
+    so the output order is guaranteed only if no source stalls.
+
+    The other keyword arguments are those of
+    `~.selector.Selector`:class:, except for `credits` which must be
+    one, since every source can have only one value buffered.
+
+    :param key: an optional function used to extract the comparison key
+      from each value, by default the values are compared directly
+    :param float timeout: the optional number of seconds after which a
+      source that has no value buffered is considered stalled
+    :param bool yield_source: If True, instead of yielding just the
+      values, the selector will yield a tuple (source, values)
+    """
+
+    _lockstep = True
+
+    def __init__(self, *sources, key=None, timeout=None, **kwargs):
+        if kwargs.get('credits', 1) != 1:
+            raise ValueError("A MergeSelector cannot have more than one"
+                             " credit per source")
+        super().__init__(*sources, **kwargs)
+        self.key = key
+        self.timeout = timeout
+        self._waiting = set()
+        """The running sources that have no value buffered and that
+        aren't stalled."""
+
+    def _cleanup(self, source):
+        super()._cleanup(source)
+        self._waiting.discard(source)
+        # wake up the consumer, it may be waiting for this source
+        self._result_avail.set()
+
+    def _start_source_loop(self, source):
+        super()._start_source_loop(source)
+        self._waiting.add(source)
+
+    def grant(self, source, credits):
+        raise ValueError("A MergeSelector cannot have more than one credit"
+                         " per source")
+
+    async def gen(self):
+        """Produce the values iterated by the consumer of the
+        MergeSelector instance, in order."""
+        assert self._status is SELECTOR_STATUS.STARTED
+        key = self.key
+        results = self._results
+        waiting = self._waiting
+        own_agen = self._gen
+        heap = []
+        counter = itertools.count()
+        all_stopped = False
+        try:
+            while True:
+                while len(results):
+                    source, v, raised = results.popleft()
+                    if v is STOPPED_TOKEN:
+                        all_stopped = True
+                    elif raised:
+                        raise v
+                    else:
+                        value = v.value if v.__class__ is Traced else v
+                        heapq.heappush(heap, (value if key is None
+                                              else key(value),
+                                              next(counter), source, v))
+                        waiting.discard(source)
+                if all_stopped and not heap:
+                    break
+                if heap and not waiting:
+                    _, _, source, v = heapq.heappop(heap)
+                    state = self._source_data.get(source)
+                    if (state is not None and
+                        state.status is not SELECTOR_STATUS.STOPPED):
+                        waiting.add(source)
+                    if v.__class__ is Traced:
+                        v = self.tracer.unwrap(v, 'selector.queue',
+                                               own_agen)
+                    if self._yield_source:
+                        sent_value = yield (source, v)
+                    else:
+                        sent_value = yield v
+                    self._send(source, sent_value, v)
+                    continue
+                self._result_avail.clear()
+                if heap and self.timeout is not None:
+                    try:
+                        await asyncio.wait_for(self._result_avail.wait(),
+                                               self.timeout, loop=self.loop)
+                    except asyncio.TimeoutError:
+                        # proceed without the stalled sources until they
+                        # provide a value
+                        waiting.clear()
+                else:
+                    await self._result_avail.wait()
+        finally:
+            if self.tracer is not None:
+                self.tracer.discard(own_agen)
+            await self._stop()
@@ -0,0 +1,171 @@
+# -*- coding: utf-8 -*-
+# :Project:   metapensiero.util.stream -- Pipeline class
+# :Created:   lun 19 ott 2026 18:20:14 CEST
+# :Author:    Alberto Berti <alberto@metapensiero.it>
+# :License:   GNU General Public License version 3 or later
+# :Copyright: © 2026 Alberto Berti
+#
+
+import asyncio
+import contextlib
+import enum
+
+from .dest import Destination
+from .selector import Selector
+from .single import SingleSourced
+from .tee import Tee
+
+
+PIPELINE_STATUS = enum.IntEnum('PipelineStatus',
+                               'INITIAL STARTED DRAINING STOPPED')
+
+
+def is_stage(obj):
+    """Tell if `obj` is one of the stream classes."""
+    return isinstance(obj, (SingleSourced, Selector))
+
+
+class Pipeline:
+    """An object that owns a graph of stages plugged together and manages
+    their tasks. It can be used as an *async context manager*: on entry
+    it starts the stages, on exit it drains them.
+
+    The stages are discovered by following the sources of the given
+    ones, so it's enough to pass the `~.dest.Destination`:class:
+    instances at the end of the graph.
+
+    Draining stops the tasks that pull from the external sources
+    first, letting them complete the values they are processing, then
+    waits for the values already buffered by the stages to flow down
+    to the destinations. The time each stage takes to
+    complete is recorded in `shutdown_latency`. The stages that
+    haven't completed when the deadline expires are cancelled and
+    recorded in `forced`.
+
+    :param stages: the stages to manage
+    :param float drain_timeout: the deadline of the drain executed on
+      exit from the context, in seconds. ``None`` means no deadline
+    :param loop: The optional loop.
+    :type loop: `asyncio.BaseEventLoop`
+    """
+
+    def __init__(self, *stages, drain_timeout=None, loop=None):
+        self.loop = loop or asyncio.get_event_loop()
+        self.drain_timeout = drain_timeout
+        self.status = PIPELINE_STATUS.INITIAL
+        self.stages = []
+        self.shutdown_latency = {}
+        self.forced = set()
+        for stage in stages:
+            self.add(stage)
+
+    async def __aenter__(self):
+        await self.start()
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.drain(self.drain_timeout)
+
+    @staticmethod
+    def _upstream(stage):
+        """Return the stages directly plugged into `stage`."""
+        if isinstance(stage, Selector):
+            sources = stage.sources
+        elif isinstance(stage, SingleSourced):
+            sources = [stage.source]
+        else:
+            sources = []
+        return [s for s in sources if is_stage(s)]
+
+    @staticmethod
+    def _pulls_external(stage):
+        """Tell if the task driving `stage` pulls from an external source,
+        maybe through stages that don't have tasks of their own."""
+        while True:
+            if isinstance(stage, (Tee, Selector)):
+                return False
+            if not isinstance(stage, SingleSourced):
+                return True
+            stage = stage.source
+
+    def _stop_external(self):
+        """Stop the tasks that pull from external sources and return the
+        futures of the stages that have to complete."""
+        pending = {}
+        for stage in self.stages:
+            if isinstance(stage, Selector):
+                fut = stage.drain([s for s in stage.sources
+                                   if self._pulls_external(s)])
+            elif isinstance(stage, (Tee, Destination)):
+                fut = stage.drain(self._pulls_external(stage.source))
+            else:
+                fut = None
+            if fut is not None:
+                pending[stage] = fut
+        return pending
+
+    async def _force_stop(self, stage, fut):
+        if isinstance(stage, Destination):
+            await stage.stop()
+        else:
+            fut.cancel()
+            with contextlib.suppress(asyncio.CancelledError, Exception):
+                await fut
+
+    def add(self, stage):
+        """Add a stage and all the stages plugged into it. The stages are
+        kept sorted so that each one comes after its sources."""
+        if not is_stage(stage):
+            raise TypeError("%r is not a stage" % stage)
+        if stage in self.stages:
+            return
+        for upstream in self._upstream(stage):
+            self.add(upstream)
+        self.stages.append(stage)
+
+    async def drain(self, timeout=None):
+        """Stop the external sources and wait for the buffered values to
+        be consumed by the destinations.
+
+        :param float timeout: the optional deadline, in seconds
+        :returns: the `shutdown_latency` dictionary
+        """
+        if self.status is not PIPELINE_STATUS.STARTED:
+            return self.shutdown_latency
+        self.status = PIPELINE_STATUS.DRAINING
+        loop = self.loop
+        begin = loop.time()
+        pending = self._stop_external()
+        for stage in self.stages:
+            if stage not in pending:
+                self.shutdown_latency[stage] = 0.0
+
+        def completed(stage, fut):
+            self.shutdown_latency[stage] = loop.time() - begin
+
+        for stage, fut in pending.items():
+            fut.add_done_callback(lambda f, stage=stage: completed(stage, f))
+        if pending:
+            done, not_done = await asyncio.wait(list(pending.values()),
+                                                timeout=timeout, loop=loop)
+            for stage, fut in pending.items():
+                if fut in not_done:
+                    self.forced.add(stage)
+                    await self._force_stop(stage, fut)
+            # let the done callbacks run
+            await asyncio.sleep(0, loop=loop)
+        self.status = PIPELINE_STATUS.STOPPED
+        return self.shutdown_latency
+
+    async def start(self):
+        """Start the stages in dependency order. The ones that pull from
+        their sources only when iterated are started by their
+        consumers, the destinations. Each destination begins iterating
+        its source before the next one is started and before any
+        value flows, so they all see the same values."""
+        if self.status is not PIPELINE_STATUS.INITIAL:
+            raise RuntimeError("The pipeline has been started already")
+        for stage in self.stages:
+            if isinstance(stage, Destination):
+                await stage.start()
+        self.status = PIPELINE_STATUS.STARTED
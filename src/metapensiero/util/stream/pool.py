@@ -0,0 +1,184 @@
+# -*- coding: utf-8 -*-
+# :Project:   metapensiero.util.stream -- pooled source connections
+# :Created:   lun 19 ott 2026 14:21:16 CEST
+# :Author:    Alberto Berti <alberto@metapensiero.it>
+# :License:   GNU General Public License version 3 or later
+# :Copyright: © 2026 Alberto Berti
+#
+
+import asyncio
+import logging
+import random
+
+from .abc import ExecPossibleAwaitable
+
+
+logger = logging.getLogger(__name__)
+
+
+class SourcePool(ExecPossibleAwaitable):
+    """A pool of long-lived connections (sockets, DB cursors and the
+    like) used to feed sources. Each connection is identified by a
+    *key* and it's established using the `connect` function only when
+    missing, so that it survives the restarts of the async generators
+    that read from it.
+
+    Use `.source()`:meth: to obtain a callable suitable as a source for
+    `~.selector.Selector`:class:, `~.tee.Tee`:class: and the other
+    stages.
+
+    :param connect: a function that given a key returns a new
+      connection or an awaitable resolving to it
+    :param close: an optional function that closes a connection,
+      possibly returning an awaitable
+    :param int max_connecting: the maximum number of connections being
+      established at the same time
+    :param int retries: the number of consecutive failures after which
+      the error is propagated to the consumer. ``None`` means retry
+      forever
+    :param float backoff: the delay before the first retry, in seconds.
+      It doubles on every consecutive failure
+    :param float max_backoff: the maximum delay between retries
+    :param bool jitter: randomize the delays to avoid many sources
+      reconnecting at the same time
+    :param loop: The optional loop.
+    :type loop: `asyncio.BaseEventLoop`
+    """
+
+    def __init__(self, connect, *, close=None, max_connecting=4,
+                 retries=None, backoff=0.1, max_backoff=30.0, jitter=True,
+                 loop=None):
+        self.loop = loop or asyncio.get_event_loop()
+        self.connect = connect
+        self.close_func = close
+        self.retries = retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.jitter = jitter
+        self._connections = {}
+        # the lock of each key being acquired, with its number of users
+        self._locks = {}
+        self._connecting = asyncio.Semaphore(max_connecting, loop=self.loop)
+        self.connects = 0
+        self.failures = 0
+
+    def __contains__(self, key):
+        return key in self._connections
+
+    def __len__(self):
+        return len(self._connections)
+
+    async def acquire(self, key):
+        """Return the connection for `key`, establishing it if needed."""
+        conn = self._connections.get(key)
+        if conn is not None:
+            return conn
+        entry = self._locks.get(key)
+        if entry is None:
+            entry = self._locks[key] = [asyncio.Lock(loop=self.loop), 0]
+        entry[1] += 1
+        try:
+            async with entry[0]:
+                conn = self._connections.get(key)
+                if conn is None:
+                    async with self._connecting:
+                        conn = await self._exec_possible_awaitable(
+                            self.connect, key)
+                    self._connections[key] = conn
+                    self.connects += 1
+        finally:
+            # drop the lock only when nobody holds or waits for it
+            entry[1] -= 1
+            if not entry[1]:
+                del self._locks[key]
+        return conn
+
+    async def close(self):
+        """Close every connection."""
+        for key in list(self._connections):
+            await self.discard(key)
+
+    def delay(self, attempt):
+        """Compute the delay before the given retry `attempt`."""
+        delay = min(self.max_backoff, self.backoff * 2 ** (attempt - 1))
+        if self.jitter:
+            delay *= random.uniform(0.5, 1.0)
+        return delay
+
+    async def discard(self, key):
+        """Drop the connection for `key`, closing it."""
+        conn = self._connections.pop(key, None)
+        if conn is not None and self.close_func is not None:
+            try:
+                await self._exec_possible_awaitable(self.close_func, conn)
+            except Exception:
+                logger.exception('Error closing connection %r', key)
+
+    def source(self, key, iterate):
+        """Return a callable source that reads from the connection `key`.
+
+        :param key: the key of the connection
+        :param iterate: a function that given a connection returns an
+          async generator reading from it
+        """
+        return PooledSource(self, key, iterate)
+
+    @property
+    def stats(self):
+        """A dictionary with the counters of the pool."""
+        return {'connections': len(self._connections),
+                'connects': self.connects, 'failures': self.failures}
+
+
+class PooledSource:
+    """A callable returning an async generator that reads from a
+    connection kept by a `SourcePool`:class:. When reading fails, the
+    connection is discarded and reestablished after a delay that
+    grows exponentially with the consecutive failures, and the
+    iteration continues.
+
+    When the generator ends or is closed the connection is kept open
+    and reused by the next generator.
+    """
+
+    def __init__(self, pool, key, iterate):
+        self.pool = pool
+        self.key = key
+        self.iterate = iterate
+
+    def __call__(self):
+        return self._gen()
+
+    def __repr__(self):
+        return '<%s for %r>' % (self.__class__.__name__, self.key)
+
+    async def _gen(self):
+        pool = self.pool
+        attempt = 0
+        send_value = None
+        while True:
+            agen = None
+            try:
+                conn = await pool.acquire(self.key)
+                agen = self.iterate(conn)
+                while True:
+                    value = await agen.asend(send_value)
+                    attempt = 0
+                    send_value = yield value
+            except StopAsyncIteration:
+                break
+            except (asyncio.CancelledError, GeneratorExit):
+                raise
+            except Exception:
+                attempt += 1
+                pool.failures += 1
+                await pool.discard(self.key)
+                if pool.retries is not None and attempt > pool.retries:
+                    raise
+                logger.warning('Source %r failed, retry #%d', self.key,
+                               attempt, exc_info=True)
+                send_value = None
+                await asyncio.sleep(pool.delay(attempt), loop=pool.loop)
+            finally:
+                if agen is not None:
+                    await agen.aclose()
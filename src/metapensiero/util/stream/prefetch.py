@@ -0,0 +1,98 @@
+# -*- coding: utf-8 -*-
+# :Project:   metapensiero.util.stream -- pulling ahead of the consumer
+# :Created:   lun 19 ott 2026 08:32:14 CEST
+# :Author:    Alberto Berti <alberto@metapensiero.it>
+# :License:   GNU General Public License version 3 or later
+# :Copyright: © 2026 Alberto Berti
+#
+
+import asyncio
+import collections
+import contextlib
+
+
+class Prefetcher:
+    """Pull the values of an async generator in a task of its own, so
+    that they keep arriving while the consumer is busy with the
+    previous ones. The values are collected in the `pending` deque and
+    when there are `max_pending` of them the pulling is suspended until
+    the consumer takes some, carrying the backpressure upstream.
+
+    The task starts immediately. When it's stopped by :meth:`close` the
+    generator is closed too.
+
+    :param agen: the async generator
+    :param int max_pending: the maximum number of values collected
+    :param convert: an optional function applied to each value when
+      it's collected
+    :param loop: The optional loop.
+    :type loop: `asyncio.BaseEventLoop`
+    """
+
+    def __init__(self, agen, max_pending, *, convert=None, loop=None):
+        self.loop = loop or asyncio.get_event_loop()
+        self.agen = agen
+        self.max_pending = max_pending
+        self.convert = convert
+        self.pending = collections.deque()
+        self.done = False
+        self.waiting = False
+        self._avail = asyncio.Event(loop=self.loop)
+        self._room = asyncio.Event(loop=self.loop)
+        self._room.set()
+        self._fut = asyncio.ensure_future(self._pump(), loop=self.loop)
+
+    async def _pump(self):
+        agen = self.agen
+        pending = self.pending
+        convert = self.convert
+        try:
+            async for value in agen:
+                pending.append(value if convert is None else convert(value))
+                self._avail.set()
+                if len(pending) >= self.max_pending:
+                    self._room.clear()
+                    await self._room.wait()
+        finally:
+            self.done = True
+            self._avail.set()
+            # a generator suspended on a value isn't closed by the loop
+            await agen.aclose()
+
+    @property
+    def idle(self):
+        """True while the consumer waits and no value is pending."""
+        return self.waiting and not self.pending
+
+    async def close(self):
+        """Stop pulling and close the generator."""
+        if not self._fut.done():
+            self._fut.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await self._fut
+
+    async def result(self):
+        """Wait for the end of the generator, raising its error if any."""
+        await self._fut
+
+    def take(self, count):
+        """Remove up to `count` pending values and return them in a
+        list."""
+        pending = self.pending
+        values = [pending.popleft() for _ in range(min(count, len(pending)))]
+        self._room.set()
+        return values
+
+    async def wait(self):
+        """Wait for a new value, the end of the generator or a call to
+        :meth:`wake`."""
+        self._avail.clear()
+        self.waiting = True
+        try:
+            await self._avail.wait()
+        finally:
+            self.waiting = False
+
+    def wake(self):
+        """Wake up the consumer waiting in :meth:`wait`."""
+        self._avail.set()
@@ -13,6 +13,9 @@ import enum
 import functools
 
 from . import STOPPED_TOKEN
+from .errors import ERROR_POLICY, ErrorReporter, restartable
+from .single import upstream_idle
+from .tracing import Traced
 
 
 SELECTOR_STATUS = enum.IntEnum('SelectorStatus',
@@ -24,21 +27,26 @@ class FutureValue:
     same as asyncio.Event but `.set()`:meth: supports an optional ``value``
     parameter. `.wait()`:meth: will return the set value.
 
+    To keep it small, the futures used to wake up the waiters are
+    created only when someone is waiting.
+
     :param loop: optional *asyncio* event loop
     """
 
+    __slots__ = ('loop', '_is_set', '_value', '_waiters')
+
     def __init__(self, loop=None):
-        if loop is None:
-            self.loop = loop = asyncio.get_event_loop()
-        self._event = asyncio.Event(loop=loop)
+        self.loop = loop or asyncio.get_event_loop()
+        self._is_set = False
         self._value = None
+        self._waiters = None
 
     def clear(self):
         self._value = None
-        self._event.clear()
+        self._is_set = False
 
     def is_set(self):
-        return self._event.is_set()
+        return self._is_set
 
     def set(self, value=None):
         """Set the instance value.
@@ -46,16 +54,66 @@ class FutureValue:
         :param value: the value to set the instance to, defaults to None
         """
         self._value = value
-        self._event.set()
+        self._is_set = True
+        waiters = self._waiters
+        if waiters is not None:
+            self._waiters = None
+            for waiter in waiters:
+                if not waiter.done():
+                    waiter.set_result(None)
 
     async def wait(self):
         """Wait for the value. It will return immediately if `.set()`:meth:
         has been called already."""
-        await self._event.wait()
+        if not self._is_set:
+            waiter = self.loop.create_future()
+            if self._waiters is None:
+                self._waiters = [waiter]
+            else:
+                self._waiters.append(waiter)
+            try:
+                await waiter
+            finally:
+                if self._waiters is not None and waiter in self._waiters:
+                    self._waiters.remove(waiter)
         return self._value
 
 
-class Selector:
+class SourceState:
+    """The state of a source followed by a `Selector`:class:. When the
+    source waits for its values to be consumed, `send_value` signals
+    each consumption, `answers` holds the values sent by the consumer
+    that are still to be delivered and `pending` counts the values
+    yielded but not yet consumed. `paired` is true once the source has
+    run ahead of the consumer, since then its answers are paired with
+    the values they reply to. `pulling` is true while the source is
+    awaited and `draining` once the selector has been asked to stop
+    pulling from it."""
+
+    __slots__ = ('status', 'send_capable', 'send_value', 'task', 'pending',
+                 'answers', 'credits', 'paired', 'pulling', 'draining')
+
+    def __init__(self, send_capable, send_value=None, credits=1):
+        self.status = SELECTOR_STATUS.INITIAL
+        self.send_capable = send_capable
+        self.send_value = send_value
+        self.task = None
+        self.pending = 0
+        self.answers = collections.deque()
+        self.credits = credits
+        self.paired = credits > 1
+        self.pulling = False
+        self.draining = False
+
+    def reset(self):
+        self.pending = 0
+        self.answers.clear()
+        self.pulling = False
+        if self.send_value is not None:
+            self.send_value.clear()
+
+
+class Selector(ErrorReporter):
     """An object that accepts multiple async iterables and *merges*
     them. It is itself an async iterable.  It supports ``.asend()`` by
     forwarding that value to the source that has provided the last
@@ -63,17 +121,64 @@ class Selector:
 
     The sources can be async generators or callables returning one.
 
+    By default a source that supports ``.asend()`` waits for each value
+    it yields to be consumed, and receives the value sent by the
+    consumer. With `credits` greater than one it can instead run ahead
+    by that many values, which wait in the selector. Such a source
+    cannot be suspended on the value being answered, so when the
+    consumer sends something other than ``None`` the source receives
+    a ``(value, answer)`` tuple, pairing the answer with the value it
+    replies to, the next time it's resumed. Otherwise it receives
+    ``None``. The answers to the values still waiting when the source
+    ends are dropped. More credits can be granted to a source with
+    `.grant()`:meth:, after which its answers are paired in any case.
+
+    What happens when a source raises an error is decided by its
+    `~.errors.ERROR_POLICY`:data:, which can be set per source with
+    `.set_error_policy()`:meth:. Only the sources that are callables or
+    that can be iterated more than once can be restarted by the
+    ``RETRY`` policy.
+
     :param bool yield_source: If True, instead of yielding just the
       values, the selector will yield a tuple (source, values)
+    :param error_policy: the default error policy of the sources, by
+      default ``FAIL``
+    :param on_error: an optional callable that receives a
+      `~.errors.StreamError`:class: for each error handled by the
+      ``ISOLATE`` and ``RETRY`` policies
+    :param int retries: the number of consecutive restarts allowed by
+      the ``RETRY`` policy
+    :param float retry_delay: the delay before the first restart, in
+      seconds. It doubles on every consecutive failure
+    :param int credits: the number of values each source can yield
+      before waiting for them to be consumed
+    :param tracer: an optional `~.tracing.Tracer`:class: that samples the
+      incoming values and records the time they wait in the queue
     """
 
-    def __init__(self, *sources, loop=None, yield_source=False):
+    _lockstep = False
+    """If True, every source waits for its last value to be consumed
+    before pulling the next one, even if it doesn't support
+    ``.asend()``."""
+
+    def __init__(self, *sources, loop=None, yield_source=False,
+                 error_policy=ERROR_POLICY.FAIL, on_error=None, retries=3,
+                 retry_delay=0.1, credits=1, tracer=None):
+        if credits < 1:
+            raise ValueError("credits must be a positive integer")
         self.loop = loop or asyncio.get_event_loop()
+        self.tracer = tracer
+        self.credits = credits
+        self.error_policy = ERROR_POLICY(error_policy)
+        self.on_error = on_error
+        self.retries = retries
+        self.retry_delay = retry_delay
+        self._error_policies = {}
         self._status = SELECTOR_STATUS.INITIAL
         self._sources = set(sources)
         self._result_avail = asyncio.Event(loop=self.loop)
         self._results = collections.deque()
-        self._source_data = collections.defaultdict(dict)
+        self._source_data = {}
         self._yield_source = yield_source
         self._gen = None
 
@@ -89,41 +194,80 @@ class Selector:
         return g
 
     def _cleanup(self, source):
-        self._source_status(source, SELECTOR_STATUS.STOPPED)
-        data = self._source_data[source]
-        if data['send_capable']:
-            data['send_value'].clear()
-        all_stopped = all(sd['status'] is SELECTOR_STATUS.STOPPED for sd in
+        state = self._source_data[source]
+        state.status = SELECTOR_STATUS.STOPPED
+        state.reset()
+        all_stopped = all(st.status is SELECTOR_STATUS.STOPPED for st in
                           self._source_data.values())
         if all_stopped:
             self._push(None, STOPPED_TOKEN)
 
-    async def _iterate_source(self, source, agen, send_value_cont=None):
-        self._source_status(source, SELECTOR_STATUS.STARTED)
-        send_capable = send_value_cont is not None
-        send_value = None
+    async def _iterate_source(self, source, agen, state):
+        state.status = SELECTOR_STATUS.STARTED
+        send_capable = state.send_capable
+        send_value_cont = state.send_value
+        tracer = self.tracer
+        attempt = 0
         try:
             while True:
-                if send_capable:
-                    el = await agen.asend(send_value)
-                else:
-                    el = await agen.__anext__()
-                self._push(source, el)
-                if send_capable:
-                    send_value = await send_value_cont.wait()
-                    send_value_cont.clear()
-        except StopAsyncIteration:
-            pass
-        except asyncio.CancelledError:
-            await agen.aclose()
-            raise
-        except GeneratorExit:
-            pass
-        except Exception as e:
-            self._push(source, e, raised=True)
+                send_value = None
+                try:
+                    while not state.draining:
+                        state.pulling = True
+                        if send_capable:
+                            el = await agen.asend(send_value)
+                        else:
+                            el = await agen.__anext__()
+                        state.pulling = False
+                        attempt = 0
+                        if tracer is not None:
+                            el = tracer.wrap(el, agen)
+                        self._push(source, el)
+                        if send_value_cont is not None:
+                            state.pending += 1
+                            answers = state.answers
+                            while (state.pending >= state.credits and
+                                   not answers):
+                                await send_value_cont.wait()
+                                send_value_cont.clear()
+                            send_value = (answers.popleft() if answers
+                                          else None)
+                    # stopped by drain()
+                    await agen.aclose()
+                except StopAsyncIteration:
+                    pass
+                except asyncio.CancelledError:
+                    await agen.aclose()
+                    raise
+                except GeneratorExit:
+                    pass
+                except Exception as e:
+                    policy = self._error_policies.get(source,
+                                                      self.error_policy)
+                    attempt += 1
+                    if (policy is ERROR_POLICY.RETRY and
+                        attempt <= self.retries and restartable(source)):
+                        await self._report_error(e, source)
+                        await asyncio.sleep(self._retry_delay(attempt),
+                                            loop=self.loop)
+                        state.reset()
+                        agen = self._make_agen(source)
+                        continue
+                    elif policy is ERROR_POLICY.ISOLATE:
+                        await self._report_error(e, source)
+                    else:
+                        self._push(source, e, raised=True)
+                break
         finally:
             self._cleanup(source)
 
+    def _make_agen(self, source):
+        if hasattr(source, '__aiter__'):
+            return source.__aiter__()
+        else:
+            assert callable(source)
+            return source()
+
     def _push(self, source, el, *, raised=False):
         """Check the result of the future. If the exception is an instance of
         ``StopAsyncIteration`` it means that the corresponding source
@@ -137,6 +281,7 @@ class Selector:
     def _remove_stopped_source(self, source,  stop_fut):
         if source in self._source_data:
             del self._source_data[source]
+        self._error_policies.pop(source, None)
         self._sources.remove(source)
 
     def _run(self):
@@ -145,49 +290,51 @@ class Selector:
             self._start_source_loop(s)
         self._status = SELECTOR_STATUS.STARTED
 
-    def _send(self, source, value):
-        sd = self._source_data[source]
-        send_value_cont = sd['send_value']
-        if send_value_cont is not None:
-            send_value_cont.set(value)
+    def _send(self, source, value, answered):
+        """Deliver the `value` sent by the consumer to the source that
+        yielded `answered`."""
+        state = self._source_data.get(source)
+        if state is not None and state.send_value is not None:
+            if value is not None:
+                if state.paired:
+                    value = (answered, value)
+                state.answers.append(value)
+            if state.pending > 0:
+                state.pending -= 1
+            state.send_value.set()
 
     def _source_status(self, source, status=None):
         if status:
-            self._source_data[source]['status'] = status
+            self._source_data[source].status = status
         else:
-            status = self._source_data[source]['status']
+            status = self._source_data[source].status
         return status
 
     def _start_source_loop(self, source):
         """Start a coroutine that will pull (and send, if it's the case) data
         from (and into) a given source using async iteration protocol.
         """
-        if hasattr(source, '__aiter__'):
-            agen = source.__aiter__()
-        else:
-            assert callable(source)
-            agen = source()
-        is_new = source not in self._source_data
-        self._source_status(source, SELECTOR_STATUS.INITIAL)
-        if is_new:
+        agen = self._make_agen(source)
+        state = self._source_data.get(source)
+        if state is None:
             send_capable = hasattr(agen, 'asend')
-            self._source_data[source]['send_capable'] = send_capable
-            if send_capable:
+            if send_capable or self._lockstep:
                 send_value_cont = FutureValue(loop=self.loop)
             else:
                 send_value_cont = None
-            self._source_data[source]['send_value'] = send_value_cont
+            state = SourceState(send_capable, send_value_cont, self.credits)
+            self._source_data[source] = state
         else:
-            send_value_cont = self._source_data[source]['send_value']
+            state.status = SELECTOR_STATUS.INITIAL
+            state.draining = False
+            state.reset()
 
-        source_fut = asyncio.ensure_future(
-            self._iterate_source(source, agen, send_value_cont),
-            loop=self.loop)
-        self._source_data[source]['task'] = source_fut
+        state.task = asyncio.ensure_future(
+            self._iterate_source(source, agen, state), loop=self.loop)
 
     async def _stop(self):
         """Stop pulling data from every registered source."""
-        for s, data in self._source_data.items():
+        for s in self._source_data:
             await self._stop_iteration_on(s)
         self._gen = None
         self._results.clear()
@@ -197,43 +344,114 @@ class Selector:
     async def _stop_iteration_on(self, source):
         """Stop pulling from a single source."""
         if self._status > SELECTOR_STATUS.INITIAL:
-            data = self._source_data[source]
-            if data['status'] is SELECTOR_STATUS.STARTED:
-                data['task'].cancel()
+            state = self._source_data[source]
+            if state.status is SELECTOR_STATUS.STARTED:
+                state.task.cancel()
             with contextlib.suppress(asyncio.CancelledError):
-                await data['task']
-            data['task'] = None
+                await state.task
+            state.task = None
+
+    def add(self, source, *, error_policy=None):
+        """Add a new source to the group of those followed.
 
-    def add(self, source):
-        """Add a new source to the group of those followed."""
+        :param error_policy: an optional error policy for the source
+        """
+        if error_policy is not None:
+            self.set_error_policy(source, error_policy)
         if source not in self._sources:
             self._sources.add(source)
             if self._status is SELECTOR_STATUS.STARTED:
                 self._start_source_loop(source)
 
+    def drain(self, sources=None):
+        """Stop pulling from some of the sources and let the others end.
+
+        No more values are pulled from each of the given `sources` and
+        it's closed: if it and the stages up to the external source are
+        only waiting for a value, the wait is cancelled since nothing is
+        lost.
+
+        :param sources: the sources to stop, by default all of them
+        :returns: a future done when every source has ended, or ``None``
+          if none is running
+        """
+        tasks = []
+        for source, state in self._source_data.items():
+            task = state.task
+            if task is None:
+                continue
+            if not task.done() and (sources is None or source in sources):
+                state.draining = True
+                if state.pulling and upstream_idle(source):
+                    task.cancel()
+            tasks.append(task)
+        if tasks:
+            return asyncio.gather(*tasks, loop=self.loop,
+                                  return_exceptions=True)
+
     async def gen(self):
         """Produce the values iterated by the consumer of the Selector
         instance."""
         assert self._status is SELECTOR_STATUS.STARTED
+        own_agen = self._gen
         try:
             while await self._result_avail.wait():
                 if len(self._results):
                     source, v, raised = self._results.popleft()
-                    if v == STOPPED_TOKEN:
+                    if v is STOPPED_TOKEN:
                         break
                     elif raised:
                         raise v
                     else:
+                        if v.__class__ is Traced:
+                            v = self.tracer.unwrap(v, 'selector.queue',
+                                                   own_agen)
                         if self._yield_source:
                             sent_value = yield (source, v)
                         else:
                             sent_value = yield v
-                        self._send(source, sent_value)
+                        self._send(source, sent_value, v)
                 else:
                     self._result_avail.clear()
         finally:
+            if self.tracer is not None:
+                self.tracer.discard(own_agen)
             await self._stop()
 
+    def set_error_policy(self, source, policy):
+        """Set the error policy of a single source.
+
+        :param source: the source
+        :param policy: an `~.errors.ERROR_POLICY`:data: value or ``None``
+          to use the default one
+        """
+        if policy is None:
+            self._error_policies.pop(source, None)
+        else:
+            self._error_policies[source] = ERROR_POLICY(policy)
+
+    def grant(self, source, credits):
+        """Allow a source to run further ahead of the consumer. From then
+        on the values sent to it are paired with the values they answer.
+
+        :param source: the source
+        :param int credits: the number of credits to add, can be
+          negative to revoke them but at least one is always left
+        """
+        state = self._source_data.get(source)
+        if state is None:
+            raise KeyError(source)
+        state.credits = max(1, state.credits + credits)
+        if state.credits > 1:
+            state.paired = True
+        if state.send_value is not None:
+            state.send_value.set()
+
+    @property
+    def sources(self):
+        """The sources followed, as a set."""
+        return frozenset(self._sources)
+
     def remove(self, source):
         if source in self._sources:
             stop_fut = asyncio.ensure_future(self._stop_iteration_on(source),
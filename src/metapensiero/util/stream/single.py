@@ -15,6 +15,13 @@ class SingleSourced(Pluggable):
     """A base class for stream classes that have only one source."""
 
     active = False
+    buffering = False
+    """True if the stage reads its source ahead of its consumers, so that
+    the position reached by the source isn't the one of the values
+    consumed."""
+    pulling = False
+    """True while the stage waits for a value from its source and has
+    none in progress."""
     _source = None
 
     def __init__(self, source=None):
@@ -54,3 +61,14 @@ class SingleSourced(Pluggable):
             raise RuntimeError("The source must be and async iterable or a "
                                "callable returning an async generator")
         self._source = value
+
+
+def upstream_idle(source):
+    """Tell if every stage from `source` up to the external source at the
+    end of the chain is waiting for a value, so that none is lost if
+    the wait is cancelled."""
+    while isinstance(source, SingleSourced):
+        if not source.pulling:
+            return False
+        source = source.source
+    return True
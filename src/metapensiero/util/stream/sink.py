@@ -18,10 +18,25 @@ class Sink(Destination):
 
     :param source: an *async generator* or a *callable* returning an *async
       generator* when called with no arguments
+    :param tracer: an optional `~.tracing.Tracer`:class:
+    :param checkpoint: an optional `~.checkpoint.CheckpointStore`:class:,
+      see `~.dest.Destination`:class:
+    :param str checkpoint_name: the name of the offset in the store
+    :param int checkpoint_every: the number of values between the saves
+    :param checkpoint_offset: an optional function returning the offset
+      of a value
+    :param int concurrency: the maximum number of values processed at
+      once
     """
 
-    def __init__(self, source=None):
-        super().__init__(source)
+    def __init__(self, source=None, *, tracer=None, checkpoint=None,
+                 checkpoint_name=None, checkpoint_every=100,
+                 checkpoint_offset=None, concurrency=1):
+        super().__init__(source, tracer=tracer, checkpoint=checkpoint,
+                         checkpoint_name=checkpoint_name,
+                         checkpoint_every=checkpoint_every,
+                         checkpoint_offset=checkpoint_offset,
+                         concurrency=concurrency)
         """The recipient of the collected values"""
         self.data = collections.deque()
 
@@ -0,0 +1,156 @@
+# -*- coding: utf-8 -*-
+# :Project:   metapensiero.util.stream -- memory mapped file source
+# :Created:   mar 20 ott 2026 02:14:51 CEST
+# :Author:    Alberto Berti <alberto@metapensiero.it>
+# :License:   GNU General Public License version 3 or later
+# :Copyright: © 2026 Alberto Berti
+#
+
+import asyncio
+import logging
+import mmap
+import os
+
+from .abc import Checkpointable
+from .framing import HEADER, MAX_FRAME_SIZE
+
+
+logger = logging.getLogger(__name__)
+
+
+class FileTail(Checkpointable):
+    """An async iterable that reads the records of an append-only file,
+    like a log. The file is memory mapped and split in big chunks, so
+    there's a single copy of each record, the one that is yielded.
+
+    The records can be lines (``framing='line'``), yielded without the
+    newline, or frames prefixed by their length
+    (``framing='length'``), like the ones written by
+    `~.bridge.write_stream()`:func:. An incomplete record at the end of
+    the file isn't yielded until it's completed.
+
+    With `follow` the file is watched for new data when its end is
+    reached, like ``tail -f`` does. If it's truncated, it's read again
+    from the beginning.
+
+    The `offset` is the position after the last record yielded, and
+    it's where the next iteration starts reading. It can be saved and
+    later given back to `.resume()`:meth: to continue from there, which
+    is what a `~.dest.Destination`:class: with a checkpoint store
+    does. With `with_offsets` each record is yielded in a tuple
+    ``(offset, record)``, to know how far it got when the records are
+    buffered by other stages.
+
+    :param str path: the path of the file
+    :param str framing: ``'line'`` or ``'length'``
+    :param int offset: the position where to start reading
+    :param bool follow: wait for new data at the end of the file
+    :param float poll_interval: the interval between the checks for new
+      data, in seconds
+    :param int chunk_size: the approximate number of bytes split at once
+    :param bool with_offsets: yield ``(offset, record)`` tuples
+    :param int max_size: the maximum size of a length-prefixed record
+    :param loop: The optional loop.
+    :type loop: `asyncio.BaseEventLoop`
+    """
+
+    def __init__(self, path, *, framing='line', offset=0, follow=False,
+                 poll_interval=0.1, chunk_size=1024 * 1024,
+                 with_offsets=False, max_size=MAX_FRAME_SIZE, loop=None):
+        if framing == 'line':
+            self._split = self._split_lines
+        elif framing == 'length':
+            self._split = self._split_frames
+        else:
+            raise ValueError("Unknown framing: %r" % framing)
+        self.loop = loop or asyncio.get_event_loop()
+        self.path = path
+        self.framing = framing
+        self.offset = offset
+        self.follow = follow
+        self.poll_interval = poll_interval
+        self.chunk_size = chunk_size
+        self.with_offsets = with_offsets
+        self.max_size = max_size
+
+    def __aiter__(self):
+        return self._gen()
+
+    def _split_frames(self, mm, pos, size):
+        """Return the length-prefixed records found in a chunk starting at
+        `pos` and the position after the last one."""
+        records = []
+        stop = pos + self.chunk_size
+        header_size = HEADER.size
+        unpack_from = HEADER.unpack_from
+        while pos < stop and size - pos >= header_size:
+            length = unpack_from(mm, pos)[0]
+            if length > self.max_size:
+                raise ValueError("Record too big at offset %d: %d bytes" %
+                                 (pos, length))
+            end = pos + header_size + length
+            if end > size:
+                break
+            records.append((end, mm[pos + header_size:end]))
+            pos = end
+        return records, pos
+
+    def _split_lines(self, mm, pos, size):
+        """Return the lines found in a chunk starting at `pos` and the
+        position after the last one."""
+        records = []
+        stop = pos + self.chunk_size
+        find = mm.find
+        while pos < stop:
+            end = find(b'\n', pos, size)
+            if end < 0:
+                break
+            records.append((end + 1, mm[pos:end]))
+            pos = end + 1
+        return records, pos
+
+    async def _gen(self):
+        loop = self.loop
+        with_offsets = self.with_offsets
+        pos = self.offset
+        mm = None
+        mapped = 0
+        with open(self.path, 'rb') as f:
+            try:
+                while True:
+                    size = os.fstat(f.fileno()).st_size
+                    if size < pos:
+                        logger.warning('%s has been truncated, reading it'
+                                       ' from the beginning', self.path)
+                        pos = self.offset = 0
+                    if size != mapped:
+                        if mm is not None:
+                            mm.close()
+                            mm = None
+                        if size:
+                            mm = mmap.mmap(f.fileno(), size,
+                                           access=mmap.ACCESS_READ)
+                        mapped = size
+                    records = None
+                    if pos < size:
+                        records, pos = self._split(mm, pos, size)
+                    if records:
+                        for offset, record in records:
+                            self.offset = offset
+                            if with_offsets:
+                                yield offset, record
+                            else:
+                                yield record
+                        # let the other tasks run between the chunks
+                        await asyncio.sleep(0, loop=loop)
+                    elif self.follow:
+                        await asyncio.sleep(self.poll_interval, loop=loop)
+                    else:
+                        break
+            finally:
+                if mm is not None:
+                    mm.close()
+
+    def resume(self, offset):
+        """Set the position where the next iteration starts reading."""
+        self.offset = offset
@@ -11,13 +11,89 @@ import collections
 import enum
 
 from . import STOPPED_TOKEN
-from .single import SingleSourced
+from .errors import (ERROR_POLICY, ErrorReporter, StreamError,
+                     restartable)
+from .single import SingleSourced, upstream_idle
+from .tracing import Traced
 
 TEE_STATUS = enum.IntEnum('TeeStatus', 'INITIAL STARTED STOPPED CLOSED')
 TEE_MODE = enum.IntEnum('TeeMode', 'PULL PUSH')
 
 
-class Tee(SingleSourced):
+class Lanes:
+    """The queue of a consumer of a `Tee`:class: with many priority
+    lanes, one deque for each lane. The lane ``0`` has the highest
+    priority and the last one is the *bulk* lane, where
+    :meth:`append` puts the values.
+
+    Without `weights` the values are taken from the first lane that
+    isn't empty. Otherwise each lane gets a share of the values
+    proportional to its weight, in a smooth round robin between the
+    lanes that aren't empty. In any case the end of the stream is
+    reached only when all the lanes are empty."""
+
+    __slots__ = ('queues', 'weights', 'current')
+
+    def __init__(self, count, weights=None):
+        self.queues = [collections.deque() for _ in range(count)]
+        self.weights = weights
+        self.current = None if weights is None else [0] * count
+
+    def __len__(self):
+        return sum(len(queue) for queue in self.queues)
+
+    def append(self, element):
+        self.queues[-1].append(element)
+
+    def clear(self):
+        for queue in self.queues:
+            queue.clear()
+
+    def popleft(self):
+        queues = self.queues
+        if self.weights is None:
+            for queue in queues:
+                if queue:
+                    return queue.popleft()
+            raise IndexError("pop from empty lanes")
+        weights = self.weights
+        current = self.current
+        best = None
+        total = 0
+        for lane, queue in enumerate(queues):
+            if queue and queue[0] is not STOPPED_TOKEN:
+                current[lane] += weights[lane]
+                total += weights[lane]
+                if best is None or current[lane] > current[best]:
+                    best = lane
+        if best is None:
+            # only the end of the stream is left, if anything
+            return queues[-1].popleft()
+        current[best] -= total
+        return queues[best].popleft()
+
+
+class ConsumerState:
+    """The state of a consumer of a `Tee`:class:. The `queue` is a deque
+    or a `Lanes`:class: instance when the Tee has many lanes. The
+    `waiter` is a future created only while the consumer waits for new
+    values and `agen` is the async generator iterated by the consumer.
+    The `route` is ``None`` for the consumers that receive
+    every value, otherwise it's a ``(kind, argument)`` tuple where kind
+    is one of ``'key'``, ``'prefix'`` or ``'predicate'``."""
+
+    __slots__ = ('queue', 'waiter', 'error_policy', 'route', 'agen')
+
+    def __init__(self, error_policy=ERROR_POLICY.FAIL, route=None,
+                 queue=None):
+        self.queue = collections.deque() if queue is None else queue
+        self.waiter = None
+        self.error_policy = error_policy
+        self.route = route
+        self.agen = None
+
+
+class Tee(SingleSourced, ErrorReporter):
     """An object clones an asynchronous iterator. It is not meant to give
     each consumer the same stream of values no matter when the
     consumer starts the iteration like the tee in itertools. Here
@@ -31,7 +107,34 @@ class Tee(SingleSourced):
     It can also work in *push* mode, where it doesn't iterates over
     any source but any value is passed in using the :meth:`push`
     method and the Tee is permanently stopped using the :meth:`close`
-    method.
+    method. The values can be pushed from other threads using
+    :meth:`push_threadsafe` and :meth:`close_threadsafe`.
+
+    When the source raises an error, the `error_policy` decides if it's
+    delivered to the consumers (``FAIL``), only reported to the
+    `on_error` callable (``ISOLATE``) or if the source is restarted
+    (``RETRY``), which is possible only if it's a callable or it can be
+    iterated more than once. Each consumer can choose to ignore the
+    errors delivered to it by iterating over `.subscribe()`:meth: with
+    the ``ISOLATE`` policy.
+
+    A consumer can also subscribe to a part of the values only, given
+    the `key` of the wanted values or a prefix of it (when it is a
+    string or a tuple), where the key of each value is computed by the
+    `key` function of the Tee. The values are routed through an index,
+    so they are appended only to the queues of the consumers that want
+    them. Consumers can also use a predicate, which is evaluated on
+    each value. An error raised by the `key` function or by a predicate
+    is delivered only to the consumers it concerns, as if it came from
+    the source.
+
+    With more than one of `lanes`, each consumer has a queue per lane
+    and the values pushed in a lane with a higher priority (a lower
+    number) skip the ones waiting in the others. By default the lanes
+    are served in strict priority order, with `lane_weights` they get
+    a share of the values proportional to their weight instead, so
+    that no lane starves. The values coming from the source go into the
+    last lane.
 
     :param aiterable source: The object to async iterate. Can be a
       direct async-iterable (which should implement an ``__aiter__``
@@ -42,36 +145,111 @@ class Tee(SingleSourced):
       stream.
     :param bool await_send: Await the availability of a sent value before
       consuming another value from the source.
+    :param int credits: with `await_send`, the number of values the
+      source can yield before waiting for a sent value. When it's
+      greater than one the source receives the sent values as
+      ``(value, answer)`` tuples, pairing each answer with the value it
+      replies to, and ``None`` when no answer is ready. More credits can
+      be granted with `.grant()`:meth:
+    :param error_policy: the `~.errors.ERROR_POLICY`:data: of the source,
+      by default ``FAIL``
+    :param on_error: an optional callable that receives a
+      `~.errors.StreamError`:class: for each error handled by the
+      ``ISOLATE`` and ``RETRY`` policies
+    :param int retries: the number of consecutive restarts allowed by
+      the ``RETRY`` policy
+    :param float retry_delay: the delay before the first restart, in
+      seconds. It doubles on every consecutive failure
+    :param tracer: an optional `~.tracing.Tracer`:class: that samples the
+      incoming values and records the time they wait in the queues
+    :param key: an optional function returning the key of each value,
+      used to route it to the consumers subscribed to that key
+    :param int lanes: the number of priority lanes
+    :param lane_weights: an optional sequence with the weight of each
+      lane
     :param loop: The optional loop.
     :type loop: `asyncio.BaseEventLoop`"""
 
+    # the values wait in the queues of the consumers
+    buffering = True
+
     # Remove the need for the loop
     def __init__(self, source=None, *, push_mode=False, loop=None,
-                 remove_none=False, await_send=False):
+                 remove_none=False, await_send=False, credits=1,
+                 error_policy=ERROR_POLICY.FAIL, on_error=None, retries=3,
+                 retry_delay=0.1, tracer=None, key=None, lanes=1,
+                 lane_weights=None):
+        if lanes < 1:
+            raise ValueError("lanes must be a positive integer")
+        if lane_weights is not None:
+            lane_weights = tuple(lane_weights)
+            if (len(lane_weights) != lanes or
+                not all(w > 0 for w in lane_weights)):
+                raise ValueError("A positive weight is needed for each lane")
+        self.lanes = lanes
+        self.lane_weights = lane_weights
         self.loop = loop or asyncio.get_event_loop()
+        self.tracer = tracer
+        self.key = key
+        self.error_policy = ERROR_POLICY(error_policy)
+        self.on_error = on_error
+        self.retries = retries
+        self.retry_delay = retry_delay
         self._mode = TEE_MODE.PUSH if push_mode else TEE_MODE.PULL
         if self._mode == TEE_MODE.PULL:
             self._status = TEE_STATUS.INITIAL
         else:
             self._status = TEE_STATUS.STARTED
         super().__init__(source)
-        self._queues = {}
+        self._consumers = set()
+        # the routing index: the consumers that want every value, those
+        # that want a given key, those that want a given prefix grouped
+        # by its length and those that have a predicate
+        self._routed = 0
+        self._broadcast = set()
+        self._by_key = {}
+        self._by_prefix = {}
+        self._by_predicate = set()
         self._run_fut = None
+        self._draining = False
         self._send_queue = collections.deque()
         self._send_cback = push_mode
         self._send_avail = asyncio.Event(loop=self.loop)
         self._remove_none = remove_none
         self._await_send = await_send
+        if credits < 1:
+            raise ValueError("credits must be a positive integer")
+        self.credits = credits
+        self._paired = credits > 1
+        self._pending = 0
+        self._foreign = collections.deque()
+        self._foreign_scheduled = False
 
     def __aiter__(self):
         return self._setup()
 
-    def _add_queue(self):
-        """Add a queue to the group that will receive the incoming values."""
-        q = collections.deque()
-        e = asyncio.Event(loop=self.loop)
-        self._queues[e] = q
-        return e, q
+    def _add_consumer(self, error_policy=ERROR_POLICY.FAIL, route=None):
+        """Add a consumer to the group that will receive the incoming
+        values."""
+        if self.lanes > 1:
+            queue = Lanes(self.lanes, self.lane_weights)
+        else:
+            queue = None
+        consumer = ConsumerState(error_policy, route, queue)
+        self._consumers.add(consumer)
+        if route is None:
+            self._broadcast.add(consumer)
+        else:
+            self._routed += 1
+            kind, arg = route
+            if kind == 'key':
+                self._by_key.setdefault(arg, set()).add(consumer)
+            elif kind == 'prefix':
+                prefixes = self._by_prefix.setdefault(len(arg), {})
+                prefixes.setdefault(arg, set()).add(consumer)
+            else:
+                self._by_predicate.add(consumer)
+        return consumer
 
     def _cleanup(self):
         """Sent to the queues a marker value that means that ther will be no
@@ -79,75 +257,257 @@ class Tee(SingleSourced):
         self._push(STOPPED_TOKEN)
         self._send_queue.clear()
 
-    async def _del_queue(self, ev):
-        """Remove a queue, called by the generator instance that is driven by
-        a consumer when it gets garbage collected. Also, if there are
+    async def _del_consumer(self, consumer):
+        """Remove a consumer, called by the generator instance that is
+        driven by it when it gets garbage collected. Also, if there are
         no more queues to fill, halt the source consuming task."""
-        queue = self._queues.pop(ev)
-        queue.clear()
-        if len(self._queues) == 0:
+        if consumer in self._consumers:
+            self._consumers.discard(consumer)
+            self._unroute(consumer)
+        consumer.queue.clear()
+        if len(self._consumers) == 0:
             if self._run_fut is not None:
                 if self._status == TEE_STATUS.STARTED:
                     self._run_fut.cancel()
-                await self._run_fut
+                # don't raise the cancellation of the task here, it may
+                # have been stopped by someone else
+                await asyncio.wait([self._run_fut], loop=self.loop)
                 self._run_fut = None
 
-    def _push(self, element):
+    def _push_foreign(self, close=False):
+        """Push the values collected by :meth:`push_threadsafe`. It runs
+        in the loop thread, once for every batch of values."""
+        # clear the flag before draining, so that a value appended
+        # while draining either gets drained or schedules a new call
+        self._foreign_scheduled = False
+        foreign = self._foreign
+        if self._status != TEE_STATUS.STARTED:
+            foreign.clear()
+            return
+        push = self.push
+        # don't starve the loop, anything appended meanwhile is pushed
+        # by the next call
+        for _ in range(len(foreign)):
+            push(foreign.popleft())
+        if close:
+            self.close()
+        elif foreign and not self._foreign_scheduled:
+            self._foreign_scheduled = True
+            self.loop.call_soon(self._push_foreign)
+
+    def _push(self, element, lane=None):
         """Push a new value into the queues and signal that a value is
-        waiting."""
-        for event, queue in self._queues.items():
-            queue.append(element)
-            event.set()
+        waiting. The `lane` is ``None`` for the bulk lane."""
+        if (self._routed and element is not STOPPED_TOKEN and
+            element.__class__ is not StreamError):
+            self._route(element, lane)
+            return
+        if lane is None:
+            for consumer in self._consumers:
+                consumer.queue.append(element)
+                waiter = consumer.waiter
+                if waiter is not None and not waiter.done():
+                    waiter.set_result(None)
+        else:
+            self._push_lane(self._consumers, element, lane)
+
+    def _push_lane(self, consumers, element, lane):
+        """Push a new value into a lane of the queues of `consumers`."""
+        for consumer in consumers:
+            consumer.queue.queues[lane].append(element)
+            waiter = consumer.waiter
+            if waiter is not None and not waiter.done():
+                waiter.set_result(None)
+
+    def _route(self, element, lane=None):
+        """Push a new value only into the queues of the consumers that
+        want it."""
+        value = element.value if element.__class__ is Traced else element
+        targets = [self._broadcast]
+        if self.key is not None:
+            try:
+                key = self.key(value)
+            except Exception as e:
+                keyed = [c for consumers in self._by_key.values()
+                         for c in consumers]
+                keyed.extend(c for prefixes in self._by_prefix.values()
+                             for consumers in prefixes.values()
+                             for c in consumers)
+                self._route_error(e, self.key, keyed, lane)
+            else:
+                consumers = self._by_key.get(key)
+                if consumers:
+                    targets.append(consumers)
+                # only the keys that are strings or tuples have prefixes
+                if self._by_prefix and isinstance(key, (str, bytes, tuple)):
+                    for length, prefixes in self._by_prefix.items():
+                        consumers = prefixes.get(key[:length])
+                        if consumers:
+                            targets.append(consumers)
+        if self._by_predicate:
+            wanted = []
+            for consumer in self._by_predicate:
+                predicate = consumer.route[1]
+                try:
+                    if predicate(value):
+                        wanted.append(consumer)
+                except Exception as e:
+                    self._route_error(e, predicate, [consumer], lane)
+            targets.append(wanted)
+        for consumers in targets:
+            if lane is not None:
+                self._push_lane(consumers, element, lane)
+                continue
+            for consumer in consumers:
+                consumer.queue.append(element)
+                waiter = consumer.waiter
+                if waiter is not None and not waiter.done():
+                    waiter.set_result(None)
+
+    def _route_error(self, exc, function, consumers, lane=None):
+        """Deliver an error raised by a routing `function` only to the
+        `consumers` it concerns, whose error policy decides if it's
+        raised or skipped. The skipped ones are reported on the side
+        channel."""
+        error = StreamError(exc, function)
+        if lane is not None:
+            self._push_lane(consumers, error, lane)
+        else:
+            for consumer in consumers:
+                consumer.queue.append(error)
+                waiter = consumer.waiter
+                if waiter is not None and not waiter.done():
+                    waiter.set_result(None)
+        if any(c.error_policy is ERROR_POLICY.ISOLATE for c in consumers):
+            asyncio.ensure_future(self._report_error(exc, function),
+                                  loop=self.loop)
 
     async def _run(self, source):
         """Private coroutine that consumes the source."""
         self._status = TEE_STATUS.STARTED
+        attempt = 0
         try:
-            send_value = None
             while True:
-                el = await source.asend(send_value)
-                self._push(el)
-                if self._await_send:
-                    await self._send_avail.wait()
-                if len(self._send_queue) > 0:
-                    send_value = self._send_queue.popleft()
-                    if self._await_send and len(self._send_queue) == 0:
-                        self._send_avail.clear()
-                else:
-                    send_value = None
-        except StopAsyncIteration:
-            pass
-        except asyncio.CancelledError:
-            await source.aclose()
-            raise
-        except GeneratorExit:
-            pass
-        except Exception as e:
-            self.push(e)
-            self._status = TEE_STATUS.STOPPED
+                send_value = None
+                self._pending = 0
+                try:
+                    while not self._draining:
+                        self.pulling = True
+                        el = await source.asend(send_value)
+                        self.pulling = False
+                        attempt = 0
+                        if self.tracer is not None:
+                            self._push(self.tracer.wrap(el, source))
+                        else:
+                            self._push(el)
+                        if self._await_send:
+                            self._pending += 1
+                            while (len(self._send_queue) == 0 and
+                                   self._pending >= self.credits):
+                                self._send_avail.clear()
+                                await self._send_avail.wait()
+                        if len(self._send_queue) > 0:
+                            send_value = self._send_queue.popleft()
+                        else:
+                            send_value = None
+                    # stopped by drain()
+                    await source.aclose()
+                except StopAsyncIteration:
+                    pass
+                except asyncio.CancelledError:
+                    await source.aclose()
+                    raise
+                except GeneratorExit:
+                    pass
+                except Exception as e:
+                    policy = self.error_policy
+                    attempt += 1
+                    if (policy is ERROR_POLICY.RETRY and
+                        attempt <= self.retries and
+                        restartable(self._source)):
+                        await self._report_error(e, self._source)
+                        await asyncio.sleep(self._retry_delay(attempt),
+                                            loop=self.loop)
+                        source = self.get_source_agen()
+                        continue
+                    elif policy is ERROR_POLICY.ISOLATE:
+                        await self._report_error(e, self._source)
+                    else:
+                        self._push(StreamError(e, self._source))
+                break
         finally:
             self._status = TEE_STATUS.STOPPED
+            self.pulling = False
             self._cleanup()
 
-    async def _send(self, value):
-        """Send a value coming from one of the consumers."""
+    async def _send(self, value, answered):
+        """Send a value coming from one of the consumers, as the answer to
+        the value `answered`."""
         assert value is not None
         if self._mode == TEE_MODE.PUSH and callable(self._send_cback):
             await self._send_cback(value)
         else:
+            if self._paired:
+                value = (answered, value)
             self._send_queue.append(value)
+            if self._pending > 0:
+                self._pending -= 1
             self._send_avail.set()
 
-    def _setup(self):
+    def _setup(self, error_policy=ERROR_POLICY.FAIL, route=None):
         if self._status in [TEE_STATUS.INITIAL, TEE_STATUS.STOPPED]:
             self.run()
-        next_value_avail, queue = self._add_queue()
-        return self.gen(next_value_avail, queue)
+        consumer = self._add_consumer(error_policy, route)
+        consumer.agen = self.gen(consumer)
+        return consumer.agen
+
+    def _unroute(self, consumer):
+        """Remove a consumer from the routing index."""
+        route = consumer.route
+        if route is None:
+            self._broadcast.discard(consumer)
+            return
+        self._routed -= 1
+        kind, arg = route
+        if kind == 'key':
+            index = self._by_key
+        elif kind == 'prefix':
+            index = self._by_prefix[len(arg)]
+        else:
+            self._by_predicate.discard(consumer)
+            return
+        consumers = index[arg]
+        consumers.discard(consumer)
+        if not consumers:
+            del index[arg]
+            if kind == 'prefix' and not index:
+                del self._by_prefix[len(arg)]
 
     @property
     def active(self):
         return self._status == TEE_STATUS.STARTED
 
+    def drain(self, stop_source=True):
+        """Let the Tee end gracefully. In *push* mode it's closed.
+        Otherwise, with `stop_source`, no more values are pulled and the
+        source is closed: if it and the stages up to the external
+        source are only waiting for a value, the wait is cancelled since
+        nothing is lost.
+
+        :returns: the future of the task consuming the source, or
+          ``None`` if it isn't running
+        """
+        if self._mode == TEE_MODE.PUSH:
+            if self._status == TEE_STATUS.STARTED:
+                self.close()
+            return None
+        fut = self._run_fut
+        if fut is not None and stop_source and not fut.done():
+            self._draining = True
+            if self.pulling and upstream_idle(self.source):
+                fut.cancel()
+        return fut
+
     def close(self):
         """Close a started tee and mark it as depleted, used in ``push``
         mode."""
@@ -155,40 +515,118 @@ class Tee(SingleSourced):
         self._status = TEE_STATUS.CLOSED
         self._cleanup()
 
-    async def gen(self, next_value_avail, queue):
+    async def gen(self, consumer):
         """An async generator instantiated per consumer."""
+        queue = consumer.queue
         if self._status == TEE_STATUS.CLOSED and len(queue) == 0:
             return
         try:
-            while await next_value_avail.wait():
+            while True:
                 if len(queue):
                     v = queue.popleft()
-                    if v == STOPPED_TOKEN:
+                    if v is STOPPED_TOKEN:
                         break
-                    elif isinstance(v, Exception):
-                        raise v
-                    else:
-                        sent_value = yield v
+                    elif v.__class__ is StreamError:
+                        if consumer.error_policy is ERROR_POLICY.FAIL:
+                            raise v.exc
+                        continue
+                    elif v.__class__ is Traced:
+                        v = self.tracer.unwrap(v, 'tee.queue', consumer.agen)
+                    sent_value = yield v
                     if sent_value is not None:
-                        await self._send(sent_value)
+                        await self._send(sent_value, v)
                 else:
-                    next_value_avail.clear()
+                    consumer.waiter = self.loop.create_future()
+                    try:
+                        await consumer.waiter
+                    finally:
+                        consumer.waiter = None
         except GeneratorExit:
             pass
         finally:
-            await self._del_queue(next_value_avail)
+            if self.tracer is not None:
+                self.tracer.discard(consumer.agen)
+            await self._del_consumer(consumer)
+
+    def grant(self, credits):
+        """Allow the source to run further ahead of the sent values. From
+        then on they are paired with the values they answer.
+
+        :param int credits: the number of credits to add, can be
+          negative to revoke them but at least one is always left
+        """
+        self.credits = max(1, self.credits + credits)
+        if self.credits > 1:
+            self._paired = True
+        self._send_avail.set()
 
-    def push(self, value):
-        """Public api to push a value."""
+    def push(self, value, lane=None):
+        """Public api to push a value. An exception instance will be raised
+        by each consumer.
+
+        :param int lane: the optional priority lane, by default the last
+          one
+        """
         assert self._status == TEE_STATUS.STARTED
-        if self._remove_none:
-            if value is not None:
-                self._push(value)
-        else:
-            self._push(value)
+        if lane is not None:
+            if not 0 <= lane < self.lanes:
+                raise ValueError("Invalid lane: %r" % lane)
+            if lane == self.lanes - 1:
+                lane = None
+        if isinstance(value, Exception):
+            self._push(StreamError(value), lane)
+        elif value is not None or not self._remove_none:
+            if self.tracer is not None:
+                value = self.tracer.wrap(value)
+            self._push(value, lane)
+
+    def push_threadsafe(self, value):
+        """Push a value from a thread other than the one running the
+        loop. The values are collected without locking and the loop is
+        woken up only once for each batch of values collected while it
+        was busy."""
+        self._foreign.append(value)
+        if not self._foreign_scheduled:
+            self._foreign_scheduled = True
+            self.loop.call_soon_threadsafe(self._push_foreign)
+
+    def close_threadsafe(self):
+        """Close the tee from a thread other than the one running the
+        loop, after the values pushed with :meth:`push_threadsafe`."""
+        self.loop.call_soon_threadsafe(self._push_foreign, True)
+
+    def subscribe(self, *, error_policy=ERROR_POLICY.FAIL, key=None,
+                  prefix=None, predicate=None):
+        """Start a new consumer, like ``__aiter__()`` but allowing to
+        configure it. At most one of `key`, `prefix` and `predicate` can
+        be given, the errors are delivered anyway.
+
+        :param error_policy: ``FAIL`` to raise the errors delivered to
+          the consumer, ``ISOLATE`` to skip them
+        :param key: receive only the values with this key
+        :param prefix: receive only the values whose key starts with
+          this string or tuple
+        :param predicate: receive only the values for which this
+          callable returns a true value
+        """
+        error_policy = ERROR_POLICY(error_policy)
+        if error_policy is ERROR_POLICY.RETRY:
+            raise ValueError("A consumer cannot retry")
+        routes = [(kind, arg) for kind, arg in (('key', key),
+                                                ('prefix', prefix),
+                                                ('predicate', predicate))
+                  if arg is not None]
+        if len(routes) > 1:
+            raise ValueError("Only one of key, prefix and predicate can be"
+                             " given")
+        route = routes[0] if routes else None
+        if route is not None and route[0] != 'predicate' and self.key is None:
+            raise ValueError("The Tee has no key function")
+        return self._setup(error_policy, route)
 
     def run(self):
         """Starts the source-consuming task."""
         agen = self.get_source_agen()
+        self._draining = False
         self._run_fut = asyncio.ensure_future(self._run(agen), loop=self.loop)
         self._status = TEE_STATUS.STARTED
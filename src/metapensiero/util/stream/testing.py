@@ -9,6 +9,7 @@
 
 import asyncio
 from contextlib import contextmanager
+import selectors
 import time
 
 
@@ -49,10 +50,198 @@ def make_async_gen(yieldables, *, initial_delay: float=0, step_delay: float=0,
 
 
 @contextmanager
-def profile(*, max_duration: float):
-    """Raises a TimeoutError when enclosed code exceeds duration."""
-    start = time.time()
+def profile(*, max_duration: float, clock=time.time):
+    """Raises a TimeoutError when enclosed code exceeds duration. Pass
+    ``clock=loop.time`` to measure the duration in the time of a
+    `VirtualTimeLoop`:class:."""
+    start = clock()
     yield
-    actual_duration = time.time() - start
+    actual_duration = clock() - start
     if actual_duration > max_duration:
         raise TimeoutError
+
+
+class _VirtualSelector:
+    """Wrap the selector of a `VirtualTimeLoop`:class: so that, instead of
+    blocking until the next scheduled callback, it advances the clock
+    to it."""
+
+    def __init__(self, selector, loop):
+        self._selector = selector
+        self._loop = loop
+
+    def __getattr__(self, name):
+        return getattr(self._selector, name)
+
+    def select(self, timeout=None):
+        events = self._selector.select(0)
+        if not events:
+            if timeout is None:
+                # nothing scheduled, only I/O or other threads can wake
+                # up the loop
+                events = self._selector.select(None)
+            elif timeout > 0:
+                self._loop._skip_to_next_timer()
+        return events
+
+
+class VirtualTimeLoop(asyncio.SelectorEventLoop):
+    """An event loop running in simulated time: whenever there is nothing
+    to do but waiting for a timer, the clock jumps to it. Sleeps and
+    timeouts take no real time and the timings are reproducible,
+    as long as the code under test uses ``loop.time()`` and not the
+    wall clock.
+
+    To run all the tests of a module with it, override the
+    ``event_loop`` fixture of pytest-asyncio::
+
+      @pytest.fixture
+      def event_loop():
+          loop = VirtualTimeLoop()
+          yield loop
+          loop.close()
+    """
+
+    def __init__(self, selector=None):
+        super().__init__(selector or selectors.DefaultSelector())
+        self._virtual_time = 0.0
+        self._selector = _VirtualSelector(self._selector, self)
+
+    def _skip_to_next_timer(self):
+        # jump to the exact deadline, adding the timeout may be lost in
+        # the rounding
+        if self._scheduled:
+            self._virtual_time = max(self._virtual_time,
+                                     self._scheduled[0]._when)
+
+    def advance(self, seconds):
+        """Move the clock forward."""
+        self._virtual_time += seconds
+
+    def time(self):
+        return self._virtual_time
+
+
+class Load:
+    """An async iterable producing values at the rates given by a
+    sequence of *phases*, each a ``(duration, rate)`` tuple with the
+    duration in seconds and the rate in values per second. A rate of
+    zero makes a pause. Values are produced in bursts of `burst`
+    values, spaced so that the average rate is kept.
+
+    The time each value has been produced at is recorded in
+    `emitted`, so that a `Meter`:class: can compute its latency.
+
+    :param phases: the ``(duration, rate)`` tuples
+    :param int burst: the number of values produced at once
+    :param func: an optional function called with the index of each
+      value to compute it, by default the index itself is produced
+    :param loop: The optional loop.
+    :type loop: `asyncio.BaseEventLoop`
+    """
+
+    def __init__(self, *phases, burst=1, func=None, loop=None):
+        if burst < 1:
+            raise ValueError("burst must be a positive integer")
+        self.loop = loop or asyncio.get_event_loop()
+        self.phases = phases
+        self.burst = burst
+        self.func = func
+        self.emitted = []
+
+    def __aiter__(self):
+        return self._gen()
+
+    @property
+    def count(self):
+        """The number of values produced by each iteration."""
+        return sum(int(duration * rate) for duration, rate in self.phases)
+
+    async def _gen(self):
+        loop = self.loop
+        func = self.func
+        emitted = self.emitted
+        emitted.clear()
+        begin = loop.time()
+        index = 0
+        for duration, rate in self.phases:
+            count = int(duration * rate)
+            for start in range(0, count, self.burst):
+                # the first value of each burst is due at its nominal time
+                delay = begin + start / rate - loop.time()
+                if delay > 0:
+                    await asyncio.sleep(delay, loop=loop)
+                for _ in range(min(self.burst, count - start)):
+                    emitted.append(loop.time())
+                    yield index if func is None else func(index)
+                    index += 1
+            begin += duration
+            delay = begin - loop.time()
+            if delay > 0:
+                await asyncio.sleep(delay, loop=loop)
+
+
+class Meter:
+    """Measure the throughput and the latency of the values produced by a
+    `Load`:class:, when they get out of the stages under test.
+
+    :param load: the `Load`:class: instance
+    :param key: an optional function returning the index of the value
+      given to :meth:`arrived`, by default the value itself is the index
+    """
+
+    def __init__(self, load, *, key=None):
+        self.load = load
+        self.key = key
+        self.latencies = []
+        self.first = None
+        self.last = None
+
+    def arrived(self, value):
+        """Record the arrival of a value."""
+        now = self.load.loop.time()
+        index = value if self.key is None else self.key(value)
+        self.latencies.append(now - self.load.emitted[index])
+        if self.first is None:
+            self.first = self.load.emitted[0]
+        self.last = now
+
+    async def consume(self, source):
+        """Iterate over `source` recording the arrival of each value."""
+        async for value in source:
+            self.arrived(value)
+
+    @property
+    def count(self):
+        return len(self.latencies)
+
+    @property
+    def throughput(self):
+        """The number of values per second."""
+        if not self.latencies or self.last == self.first:
+            return 0.0
+        return self.count / (self.last - self.first)
+
+    def latency(self, q):
+        """Return the `q` percentile (between 0 and 100) of the latencies."""
+        latencies = sorted(self.latencies)
+        if not latencies:
+            return 0.0
+        return latencies[min(len(latencies) - 1,
+                             int(len(latencies) * q / 100))]
+
+    def assert_latency(self, q, max_latency):
+        """Raise an `AssertionError` if the `q` percentile of the
+        latencies exceeds `max_latency`."""
+        latency = self.latency(q)
+        if latency > max_latency:
+            raise AssertionError("p%s latency %.6fs exceeds %.6fs" % (
+                q, latency, max_latency))
+
+    def assert_throughput(self, min_throughput):
+        """Raise an `AssertionError` if the throughput is lower than
+        `min_throughput` values per second."""
+        throughput = self.throughput
+        if throughput < min_throughput:
+            raise AssertionError("Throughput %.1f/s lower than %.1f/s" % (
+                throughput, min_throughput))
@@ -0,0 +1,189 @@
+# -*- coding: utf-8 -*-
+# :Project:   metapensiero.util.stream -- sampled latency tracing
+# :Created:   lun 19 ott 2026 23:05:31 CEST
+# :Author:    Alberto Berti <alberto@metapensiero.it>
+# :License:   GNU General Public License version 3 or later
+# :Copyright: © 2026 Alberto Berti
+#
+
+import bisect
+import random
+import time
+
+
+BOUNDS = tuple(1e-6 * 2 ** i for i in range(32))
+"""The upper bounds of the buckets of a `Histogram`:class:, in seconds,
+from one microsecond to more than half an hour."""
+
+
+class Histogram:
+    """A latency histogram with logarithmic buckets, whose memory doesn't
+    depend on the number of recorded values."""
+
+    __slots__ = ('count', 'total', 'max', '_buckets')
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self._buckets = [0] * (len(BOUNDS) + 1)
+
+    def add(self, value):
+        """Record a duration, in seconds."""
+        self.count += 1
+        self.total += value
+        if value > self.max:
+            self.max = value
+        self._buckets[bisect.bisect_left(BOUNDS, value)] += 1
+
+    def percentile(self, q):
+        """Return the upper bound of the bucket that contains the `q`
+        percentile (between 0 and 100) of the recorded durations."""
+        if not self.count:
+            return 0.0
+        rank = self.count * q / 100
+        seen = 0
+        for index, count in enumerate(self._buckets):
+            seen += count
+            if seen >= rank:
+                break
+        if index < len(BOUNDS):
+            return min(BOUNDS[index], self.max)
+        return self.max
+
+    @property
+    def stats(self):
+        return {'count': self.count,
+                'mean': self.total / self.count if self.count else 0.0,
+                'p50': self.percentile(50), 'p99': self.percentile(99),
+                'max': self.max}
+
+
+class Trace:
+    """The timestamps of a sampled value: when it entered the pipeline
+    and when it passed the last hop."""
+
+    __slots__ = ('ingress', 'mark')
+
+    def __init__(self, ingress, mark=None):
+        self.ingress = ingress
+        self.mark = ingress if mark is None else mark
+
+    def copy(self):
+        return Trace(self.ingress, self.mark)
+
+
+class Traced:
+    """The envelope of a sampled value while it's buffered by a stage."""
+
+    __slots__ = ('value', 'trace')
+
+    def __init__(self, value, trace):
+        self.value = value
+        self.trace = trace
+
+
+class Tracer:
+    """Collect the latency of the values flowing through the stages that
+    are given the same tracer.
+
+    A fraction of the values entering a `~.tee.Tee`:class: or a
+    `~.selector.Selector`:class: is sampled and timestamped. Each stage
+    records the time spent by the sampled values since the previous
+    hop in a `Histogram`:class:, distinguishing the time spent waiting
+    in the queues (``tee.queue``, ``selector.queue``) from the
+    processing time (``transformer.process``, ``destination.process``).
+    A `~.dest.Destination`:class: also records the whole latency in
+    ``end_to_end``.
+
+    Values are passed between the stages without any envelope: the
+    stage that yields a sampled value hands off its trace to the
+    tracer, under the async generator that yields it, and the stage
+    iterating that generator takes it back together with the same
+    value. If anything in between replaces the value, the trace is
+    dropped. The values that aren't sampled cost a single test in each
+    stage.
+
+    :param float sample_rate: the fraction of the values to sample,
+      between 0 and 1
+    :param clock: an optional function returning the current time in
+      seconds, by default `time.perf_counter`
+    """
+
+    def __init__(self, sample_rate=0.01, *, clock=None):
+        if not 0 <= sample_rate <= 1:
+            raise ValueError("sample_rate must be between 0 and 1")
+        self.sample_rate = sample_rate
+        self.clock = clock or time.perf_counter
+        self.histograms = {}
+        self._handoffs = {}
+
+    def _record(self, hop, duration):
+        histogram = self.histograms.get(hop)
+        if histogram is None:
+            histogram = self.histograms[hop] = Histogram()
+        histogram.add(duration)
+
+    def finish(self, trace, hop='end_to_end'):
+        """Record the time elapsed since the value entered the pipeline."""
+        self._record(hop, self.clock() - trace.ingress)
+
+    def discard(self, agen):
+        """Forget the trace handed off by `agen`, when it ends."""
+        self._handoffs.pop(agen, None)
+
+    def handoff(self, trace, value, agen):
+        """Pass the `trace` of `value` to the stage iterating `agen`,
+        which must `.take()`:meth: it before anything else is yielded."""
+        self._handoffs[agen] = (value, trace)
+
+    def mark(self, trace, hop):
+        """Record the time elapsed since the previous hop of `trace`."""
+        now = self.clock()
+        self._record(hop, now - trace.mark)
+        trace.mark = now
+        return trace
+
+    def sample(self):
+        """Return a new `Trace`:class: if the next value has to be
+        sampled, or ``None``."""
+        rate = self.sample_rate
+        if rate and (rate == 1 or random.random() < rate):
+            return Trace(self.clock())
+
+    def take(self, value, agen):
+        """Return the trace handed off with `value` by `agen`, if any."""
+        handoffs = self._handoffs
+        if handoffs:
+            handoff = handoffs.pop(agen, None)
+            if handoff is not None and handoff[0] is value:
+                return handoff[1]
+
+    def unwrap(self, traced, hop, agen):
+        """Take the value out of its envelope, record the time it waited
+        in `hop` and hand it off under `agen`. The envelope may be shared
+        between many consumers, so the trace is copied."""
+        value = traced.value
+        self.handoff(self.mark(traced.trace.copy(), hop), value, agen)
+        return value
+
+    def wrap(self, value, agen=None):
+        """Put `value` in an envelope if it has been handed off with a
+        trace by `agen` or if it's sampled now, otherwise return it
+        unchanged."""
+        trace = None if agen is None else self.take(value, agen)
+        if trace is None:
+            trace = self.sample()
+            if trace is None:
+                return value
+        return Traced(value, trace)
+
+    def reset(self):
+        """Forget the recorded latencies."""
+        self.histograms.clear()
+
+    @property
+    def stats(self):
+        """A dictionary with the statistics of each hop."""
+        return {hop: histogram.stats
+                for hop, histogram in self.histograms.items()}
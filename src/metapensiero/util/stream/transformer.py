@@ -14,29 +14,66 @@ from .single import SingleSourced
 
 class Transformer(SingleSourced, ExecPossibleAwaitable):
     """A small utility class to alter a stream of values generated or sent
-    to an async iterator."""
+    to an async iterator.
 
-    def __init__(self, fyield=None, fsend=None, source=None):
+    The results of `fyield` can be memoized by passing a
+    `~.cache.BoundedCache`:class: instance as `cache`, in which case
+    `cache_key` can be used to compute the key of each value (by
+    default the value itself is used). Concurrent computations for the
+    same key are coalesced. The keys don't include `fyield`, so a cache
+    can be shared only between transformers that use the same
+    function.
+
+    :param fyield: an optional function applied to each yielded value
+    :param fsend: an optional function applied to each sent value
+    :param source: an *async iterable* or a *callable* returning an *async
+      generator* when called with no arguments
+    :param cache: an optional `~.cache.BoundedCache`:class: instance
+    :param cache_key: an optional function to compute the cache key of
+      each value
+    :param tracer: an optional `~.tracing.Tracer`:class: that records the
+      time spent by `fyield` on the sampled values
+    """
+
+    def __init__(self, fyield=None, fsend=None, source=None, *, cache=None,
+                 cache_key=None, tracer=None):
         self._agen = None
         super().__init__(source)
         self.yield_func = fyield
         self.send_func = fsend
+        self.cache = cache
+        self.cache_key = cache_key
+        self.tracer = tracer
 
     def __aiter__(self):
         self.check_source()
         if self._agen is not None:
             raise RuntimeError("Already itered on")
-        self._agen = self._gen(self.yield_func, self.send_func)
+        self._agen = self._gen(self.yield_func, self.send_func, self.cache,
+                               self.cache_key)
         return self._agen
 
-    async def _gen(self, fyield=None, fsend=None):
+    async def _gen(self, fyield=None, fsend=None, cache=None, cache_key=None):
         agen = self.get_source_agen()
+        own_agen = self._agen
+        tracer = self.tracer
         send_value = None
         try:
             while True:
+                self.pulling = True
                 value = await agen.asend(send_value)
+                self.pulling = False
+                trace = None if tracer is None else tracer.take(value, agen)
                 if fyield is not None:
-                    value = await self._exec_possible_awaitable(fyield, value)
+                    if cache is not None:
+                        key = value if cache_key is None else cache_key(value)
+                        value = await cache.fetch(key, fyield, value)
+                    else:
+                        value = await self._exec_possible_awaitable(fyield,
+                                                                    value)
+                if trace is not None:
+                    tracer.handoff(tracer.mark(trace, 'transformer.process'),
+                                   value, own_agen)
                 send_value = yield value
                 if fsend and send_value is not None:
                     send_value = await self._exec_possible_awaitable(fsend,
@@ -46,8 +83,16 @@ class Transformer(SingleSourced, ExecPossibleAwaitable):
         except asyncio.CancelledError:
             pass
         finally:
+            if tracer is not None:
+                tracer.discard(own_agen)
+            self.pulling = False
             self._agen = None
 
     @property
     def active(self):
         return self._agen is not None
+
+    @property
+    def stats(self):
+        """The counters of the cache, if any."""
+        return None if self.cache is None else self.cache.stats
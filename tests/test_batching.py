@@ -0,0 +1,127 @@
+# -*- coding: utf-8 -*-
+# :Project:   metapensiero.util.stream -- Batcher class tests
+# :Created:   lun 19 ott 2026 22:48:10 CEST
+# :Author:    Alberto Berti <alberto@metapensiero.it>
+# :License:   GNU General Public License version 3 or later
+# :Copyright: © 2026 Alberto Berti
+#
+
+import asyncio
+
+import pytest
+
+from metapensiero.util.stream import (AdaptiveBatching, Batcher, Sink, Tee,
+                                      Transformer)
+from metapensiero.util.stream.testing import make_async_gen
+
+
+def test_controller_grows_under_backlog():
+    ctl = AdaptiveBatching(0.1, min_size=1, max_size=64)
+    for _ in range(50):
+        ctl.record(ctl.size, 0.01, 1000)
+    assert ctl.size == 64
+    assert ctl.stats['batches'] == 50
+    assert ctl.stats['queue_depth'] == 1000
+
+
+def test_controller_shrinks_over_target():
+    ctl = AdaptiveBatching(0.1, min_size=1, max_size=64, max_linger=0.05)
+    ctl.size = 64
+    ctl.linger = 0.04
+    ctl.record(64, 0.5, 1000)
+    assert ctl.size == 32
+    assert ctl.linger == 0.02
+    # the latencies measured before the decrease are forgotten
+    assert ctl.p99 == 0.0
+
+
+def test_controller_lingers_when_idle():
+    ctl = AdaptiveBatching(0.1, min_size=4, max_size=64, max_linger=0.05)
+    for _ in range(20):
+        ctl.record(1, 0.001, 0)
+    assert ctl.size == 4
+    assert ctl.linger == pytest.approx(0.05)
+
+
+def test_controller_bounds():
+    with pytest.raises(ValueError):
+        AdaptiveBatching(0)
+    with pytest.raises(ValueError):
+        AdaptiveBatching(0.1, min_size=10, max_size=5)
+
+
+@pytest.mark.asyncio
+async def test_batcher(event_loop):
+    ctl = AdaptiveBatching(1, min_size=4, max_size=16)
+    batcher = Batcher(make_async_gen(range(100)), controller=ctl,
+                      loop=event_loop)
+    batches = [b async for b in batcher]
+    assert sum(batches, []) == list(range(100))
+    assert max(len(b) for b in batches) > 1
+    assert batcher.stats['batches'] == len(batches)
+    assert not batcher.active
+
+
+@pytest.mark.asyncio
+async def test_batcher_shrinks_with_slow_destination(event_loop):
+    ctl = AdaptiveBatching(0.02, min_size=1, max_size=64, min_linger=0.005)
+    ctl.size = 64
+    sizes = []
+
+    async def slow(batch):
+        sizes.append(len(batch))
+        await asyncio.sleep(0.001 * len(batch), loop=event_loop)
+
+    class SlowSink(Sink):
+        _destination = staticmethod(slow)
+
+    batcher = Batcher(make_async_gen(range(300)), controller=ctl,
+                      loop=event_loop)
+    sink = SlowSink(batcher)
+    await sink.start()
+    await sink._run_fut
+    assert sizes[0] == 64
+    assert ctl.size < 64
+    assert sum(sizes) == 300
+
+
+@pytest.mark.asyncio
+async def test_batcher_in_pipeline(event_loop):
+    tee = Tee(make_async_gen(range(20)), loop=event_loop)
+    ctl = AdaptiveBatching(1, min_size=4, max_size=4, min_linger=0.5,
+                           max_linger=0.5)
+    batcher = Batcher(tee, controller=ctl, loop=event_loop)
+    totals = Transformer(sum, None, batcher)
+    assert [v async for v in totals] == [6, 22, 38, 54, 70]
+
+
+@pytest.mark.asyncio
+async def test_batcher_error(event_loop):
+    async def failing():
+        yield 1
+        raise ZeroDivisionError()
+
+    batcher = Batcher(failing, controller=AdaptiveBatching(1),
+                      loop=event_loop)
+    with pytest.raises(ZeroDivisionError):
+        async for batch in batcher:
+            pass
+    assert not batcher.active
+
+
+@pytest.mark.asyncio
+async def test_batcher_closes_source(event_loop):
+    tee = Tee(push_mode=True, loop=event_loop)
+    batcher = Batcher(tee, controller=AdaptiveBatching(1), max_pending=2,
+                      loop=event_loop)
+    agen = batcher.__aiter__()
+    fut = asyncio.ensure_future(agen.__anext__(), loop=event_loop)
+    await asyncio.sleep(0, loop=event_loop)
+    for i in range(10):
+        tee.push(i)
+    await fut
+    await asyncio.sleep(0.01, loop=event_loop)
+    assert len(tee._consumers) == 1
+    # the source is suspended on a value, it's closed with the batcher
+    await agen.aclose()
+    assert len(tee._consumers) == 0
@@ -0,0 +1,106 @@
+# -*- coding: utf-8 -*-
+# :Project:   metapensiero.util.stream -- BlockingSource class tests
+# :Created:   mar 20 ott 2026 01:52:27 CEST
+# :Author:    Alberto Berti <alberto@metapensiero.it>
+# :License:   GNU General Public License version 3 or later
+# :Copyright: © 2026 Alberto Berti
+#
+
+import asyncio
+import sqlite3
+import threading
+import time
+
+import pytest
+
+from metapensiero.util.stream import (BlockingSource, Selector, Tee,
+                                      Transformer)
+
+
+@pytest.mark.asyncio
+async def test_blocking_iterable(event_loop):
+    source = BlockingSource(range(100), chunk_size=7, loop=event_loop)
+    assert [v async for v in source] == list(range(100))
+    assert source.stats['chunks'] == 15
+    # it can be iterated again
+    tee = Tee(source, loop=event_loop)
+    assert [v async for v in Transformer(lambda v: v * 2, None, tee)] == [
+        v * 2 for v in range(100)]
+
+
+@pytest.mark.asyncio
+async def test_blocking_fetch(event_loop):
+    db = sqlite3.connect(':memory:', check_same_thread=False)
+    db.execute('create table t (v integer)')
+    db.executemany('insert into t values (?)', [(i,) for i in range(50)])
+    cursor = db.execute('select v from t order by v')
+    source = BlockingSource(fetch=lambda: cursor.fetchmany(8),
+                            loop=event_loop)
+    sel = Selector(source, loop=event_loop)
+    assert [row[0] async for row in sel] == list(range(50))
+    with pytest.raises(ValueError):
+        BlockingSource()
+
+
+@pytest.mark.asyncio
+async def test_blocking_does_not_block_loop(event_loop):
+    threads = set()
+
+    def slow_reader():
+        for i in range(5):
+            threads.add(threading.get_ident())
+            time.sleep(0.02)
+            yield i
+
+    ticks = 0
+
+    async def ticker():
+        nonlocal ticks
+        while True:
+            ticks += 1
+            await asyncio.sleep(0.005, loop=event_loop)
+
+    tick_fut = asyncio.ensure_future(ticker(), loop=event_loop)
+    source = BlockingSource(slow_reader, chunk_size=1, loop=event_loop)
+    assert [v async for v in source] == list(range(5))
+    tick_fut.cancel()
+    assert threading.get_ident() not in threads
+    assert ticks > 5
+
+
+@pytest.mark.asyncio
+async def test_blocking_bounded_and_stopped(event_loop):
+    read = 0
+
+    def endless():
+        nonlocal read
+        while True:
+            read += 1
+            yield read
+
+    source = BlockingSource(endless, chunk_size=10, max_chunks=2,
+                            loop=event_loop)
+    agen = source.__aiter__()
+    assert await agen.__anext__() == 1
+    await asyncio.sleep(0.05, loop=event_loop)
+    # one chunk consumed, two buffered and one waiting for room
+    assert read <= 40
+    await agen.aclose()
+    stopped_at = read
+    await asyncio.sleep(0.05, loop=event_loop)
+    assert read == stopped_at
+
+
+@pytest.mark.asyncio
+async def test_blocking_error(event_loop):
+    def failing():
+        yield 1
+        raise ZeroDivisionError()
+
+    source = BlockingSource(failing, loop=event_loop)
+    result = []
+    with pytest.raises(ZeroDivisionError):
+        async for v in source:
+            result.append(v)
+    # the values read before the error are delivered first
+    assert result == [1]
@@ -0,0 +1,100 @@
+# -*- coding: utf-8 -*-
+# :Project:   metapensiero.util.stream -- inter-process bridge tests
+# :Created:   lun 19 ott 2026 22:10:44 CEST
+# :Author:    Alberto Berti <alberto@metapensiero.it>
+# :License:   GNU General Public License version 3 or later
+# :Copyright: © 2026 Alberto Berti
+#
+
+import asyncio
+import os
+
+import pytest
+
+from metapensiero.util.stream import BridgeServer, BridgeSource, Sink, Tee
+from metapensiero.util.stream.bridge import (open_pipe_reader,
+                                             open_pipe_writer, read_stream,
+                                             write_stream)
+from metapensiero.util.stream.framing import FrameDecoder, encode_frames
+from metapensiero.util.stream.testing import make_async_gen
+
+
+def test_frame_decoder():
+    data = encode_frames([b'a', b'', b'bcd' * 100])
+    decoder = FrameDecoder()
+    payloads = []
+    for i in range(0, len(data), 7):
+        payloads.extend(decoder.feed(data[i:i+7]))
+    assert payloads == [b'a', b'', b'bcd' * 100]
+    assert decoder.pending == 0
+
+    decoder = FrameDecoder(max_size=10)
+    with pytest.raises(ValueError):
+        decoder.feed(encode_frames([b'x' * 11]))
+
+
+@pytest.mark.asyncio
+async def test_bridge(event_loop, tmp_path):
+    path = str(tmp_path / 'bridge.sock')
+    tee = Tee(push_mode=True)
+    async with BridgeServer(tee, path):
+        sinks = [Sink(BridgeSource(path)) for _ in range(2)]
+        for sink in sinks:
+            await sink.start()
+        # wait for the clients to subscribe
+        while len(tee._consumers) < 2:
+            await asyncio.sleep(0.01)
+        values = [{'n': i, 'data': 'x' * i} for i in range(1000)]
+        for v in values:
+            tee.push(v)
+        tee.close()
+        for sink in sinks:
+            await asyncio.wait_for(sink._run_fut, 5)
+            assert list(sink) == values
+
+
+@pytest.mark.asyncio
+async def test_bridge_idle_disconnect(event_loop, tmp_path):
+    path = str(tmp_path / 'bridge.sock')
+    tee = Tee(push_mode=True)
+    async with BridgeServer(tee, path):
+        reader, writer = await asyncio.open_unix_connection(path)
+        while len(tee._consumers) < 1:
+            await asyncio.sleep(0.01)
+        writer.close()
+        # noticed without waiting for a value to write
+        for _ in range(100):
+            if not tee._consumers:
+                break
+            await asyncio.sleep(0.01)
+        assert len(tee._consumers) == 0
+
+
+@pytest.mark.asyncio
+async def test_bridge_pipe(event_loop):
+    rfd, wfd = os.pipe()
+    with open(rfd, 'rb', buffering=0) as rpipe, \
+         open(wfd, 'wb', buffering=0) as wpipe:
+        reader = await open_pipe_reader(rpipe)
+        writer = await open_pipe_writer(wpipe)
+        values = list(range(5000))
+        await write_stream(make_async_gen(values), writer, max_batch=100)
+        writer.close()
+        assert [v async for v in read_stream(reader)] == values
+
+
+@pytest.mark.asyncio
+async def test_bridge_msgpack(event_loop):
+    pytest.importorskip('msgpack')
+    rfd, wfd = os.pipe()
+    with open(rfd, 'rb', buffering=0) as rpipe, \
+         open(wfd, 'wb', buffering=0) as wpipe:
+        reader = await open_pipe_reader(rpipe)
+        writer = await open_pipe_writer(wpipe)
+        values = [{'n': i, 'data': b'x' * i, 'tags': ['a', 'b']}
+                  for i in range(500)]
+        await write_stream(make_async_gen(values), writer, max_batch=50,
+                           codec='msgpack')
+        writer.close()
+        assert [v async for v in read_stream(reader,
+                                             codec='msgpack')] == values
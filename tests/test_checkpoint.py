@@ -0,0 +1,114 @@
+# -*- coding: utf-8 -*-
+# :Project:   metapensiero.util.stream -- checkpoint tests
+# :Created:   mar 20 ott 2026 03:38:47 CEST
+# :Author:    Alberto Berti <alberto@metapensiero.it>
+# :License:   GNU General Public License version 3 or later
+# :Copyright: © 2026 Alberto Berti
+#
+
+import pytest
+
+from metapensiero.util.stream import (FileCheckpointStore, FileTail,
+                                      SQLiteCheckpointStore, Sink, Tee,
+                                      Transformer)
+from metapensiero.util.stream.abc import Checkpointable
+from metapensiero.util.stream.testing import make_async_gen
+
+
+@pytest.mark.parametrize('store_class', [FileCheckpointStore,
+                                         SQLiteCheckpointStore])
+def test_stores(tmp_path, store_class):
+    path = str(tmp_path / 'checkpoints')
+    store = store_class(path)
+    assert store.load('a') is None
+    store.save('a', 10)
+    store.save('b', [1, 'x'])
+    store.save('a', 20)
+    store.close()
+    store = store_class(path)
+    assert store.load('a') == 20
+    assert store.load('b') == [1, 'x']
+    store.close()
+
+
+def test_sqlite_table_name(tmp_path):
+    path = str(tmp_path / 'checkpoints.db')
+    store = SQLiteCheckpointStore(path, table='offsets_1')
+    store.close()
+    with pytest.raises(ValueError):
+        SQLiteCheckpointStore(path, table='x; DROP TABLE offsets_1')
+
+
+def test_checkpointable():
+    assert issubclass(FileTail, Checkpointable)
+
+    class Cursor:
+        offset = 0
+
+        def resume(self, offset):
+            self.offset = offset
+
+    class Resumable:
+
+        def resume(self, offset):
+            pass
+
+    assert isinstance(Cursor(), Checkpointable)
+    assert not isinstance(Resumable(), Checkpointable)
+    assert not isinstance(Tee(push_mode=True), Checkpointable)
+
+
+@pytest.mark.asyncio
+async def test_resume(event_loop, tmp_path):
+    log = tmp_path / 'log'
+    log.write_bytes(b''.join(b'%d\n' % i for i in range(10)))
+    store = SQLiteCheckpointStore(str(tmp_path / 'checkpoints.db'))
+
+    class Failing(Sink):
+        async def _destination(self, element):
+            if element == 7:
+                raise ZeroDivisionError()
+            await super()._destination(element)
+
+    def make(sink_class):
+        tail = FileTail(str(log), loop=event_loop)
+        return sink_class(Transformer(int, None, tail), checkpoint=store,
+                          checkpoint_name='log', checkpoint_every=3)
+
+    sink = make(Failing)
+    await sink.start()
+    with pytest.raises(ZeroDivisionError):
+        await sink._run_fut
+    assert list(sink) == list(range(7))
+    # the offset of the last processed value is flushed on failure
+    assert store.load('log') == 14
+
+    # a new process resumes after the last processed value
+    sink = make(Sink)
+    await sink.start()
+    await sink._run_fut
+    assert list(sink) == [7, 8, 9]
+    assert store.load('log') == 20
+
+
+@pytest.mark.asyncio
+async def test_checkpoint_offset(event_loop, tmp_path):
+    log = tmp_path / 'log'
+    log.write_bytes(b'a\nb\nc\n')
+    store = FileCheckpointStore(str(tmp_path / 'checkpoints.json'))
+    tail = FileTail(str(log), with_offsets=True, loop=event_loop)
+    tee = Tee(tail, loop=event_loop)
+    with pytest.raises(ValueError):
+        Sink(tee, checkpoint=store)
+    sink = Sink(tee, checkpoint=store, checkpoint_name='tee')
+    with pytest.raises(RuntimeError):
+        await sink.start()
+    sink = Sink(tee, checkpoint=store, checkpoint_name='tee',
+                checkpoint_offset=lambda v: v[0])
+    await sink.start()
+    await sink._run_fut
+    assert [r for _, r in sink] == [b'a', b'b', b'c']
+    assert store.load('tee') == 6
+    with pytest.raises(ValueError):
+        Sink(make_async_gen([]), checkpoint=store, checkpoint_name='x',
+             checkpoint_every=0)
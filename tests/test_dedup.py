@@ -0,0 +1,76 @@
+# -*- coding: utf-8 -*-
+# :Project:   metapensiero.util.stream -- Deduplicator class tests
+# :Created:   lun 19 ott 2026 11:02:44 CEST
+# :Author:    Alberto Berti <alberto@metapensiero.it>
+# :License:   GNU General Public License version 3 or later
+# :Copyright: © 2026 Alberto Berti
+#
+
+import pytest
+
+from metapensiero.util.stream import (BloomIndex, Deduplicator, LRUIndex,
+                                      TTLIndex)
+from metapensiero.util.stream.testing import make_async_gen
+
+
+def test_lru_index():
+    index = LRUIndex(maxsize=2)
+    assert not index.seen('a')
+    assert not index.seen('b')
+    assert index.seen('a')
+    assert not index.seen('c')
+    # 'b' was the least recently seen
+    assert 'b' not in index
+    assert 'a' in index
+    assert len(index) == 2
+    assert index.stats == {'hits': 1, 'misses': 3, 'size': 2}
+
+
+def test_ttl_index():
+    now = 0
+
+    def clock():
+        return now
+
+    index = TTLIndex(10, maxsize=100, clock=clock)
+    assert not index.seen('a')
+    now = 5
+    assert index.seen('a')
+    now = 11
+    assert not index.seen('a')
+    assert len(index) == 1
+
+    index = TTLIndex(10, maxsize=3, clock=clock)
+    for i in range(10):
+        index.seen(i)
+    assert len(index) == 3
+
+
+def test_bloom_index():
+    index = BloomIndex(capacity=1000, error_rate=0.01)
+    nbytes = index.nbytes
+    for i in range(1000):
+        index.seen('key-%d' % i)
+    assert index.misses > 990
+    assert all('key-%d' % i in index for i in range(1000))
+    false_positives = sum(1 for i in range(1000, 11000)
+                          if 'key-%d' % i in index)
+    assert false_positives < 300
+    for i in range(100000):
+        index.add(i)
+    assert index.nbytes == nbytes
+    assert len(index) <= 1000
+
+
+@pytest.mark.asyncio
+async def test_deduplicator():
+    source = make_async_gen([1, 2, 1, 3, 2, 4, 4, 5])
+    dedup = Deduplicator(source)
+    assert [v async for v in dedup] == [1, 2, 3, 4, 5]
+    assert dedup.stats == {'hits': 3, 'misses': 5, 'size': 5}
+
+    source = make_async_gen([{'id': 1, 'v': 'a'}, {'id': 1, 'v': 'b'},
+                             {'id': 2, 'v': 'c'}])
+    dedup = Deduplicator(source, key=lambda e: e['id'],
+                         index=LRUIndex(maxsize=10))
+    assert [v['v'] async for v in dedup] == ['a', 'c']
@@ -0,0 +1,142 @@
+# -*- coding: utf-8 -*-
+# :Project:   metapensiero.util.stream -- Destination class tests
+# :Created:   mar 20 ott 2026 04:22:09 CEST
+# :Author:    Alberto Berti <alberto@metapensiero.it>
+# :License:   GNU General Public License version 3 or later
+# :Copyright: © 2026 Alberto Berti
+#
+
+import asyncio
+
+import pytest
+
+from metapensiero.util.stream import FileCheckpointStore, FileTail, Sink
+from metapensiero.util.stream.testing import (VirtualTimeLoop,
+                                              make_async_gen)
+
+
+@pytest.fixture
+def event_loop():
+    loop = VirtualTimeLoop()
+    yield loop
+    loop.close()
+
+
+class SlowSink(Sink):
+    """Each value takes as many seconds as its value to be written."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+    async def _destination(self, element):
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            await asyncio.sleep(element)
+            await super()._destination(element)
+            return element * 10
+        finally:
+            self.in_flight -= 1
+
+
+@pytest.mark.asyncio
+async def test_concurrency(event_loop):
+    sink = SlowSink(make_async_gen([1] * 12), concurrency=4)
+    await sink.start()
+    await sink._run_fut
+    assert len(sink) == 12
+    assert sink.max_in_flight == 4
+    # four writes at a time
+    assert event_loop.time() == pytest.approx(3)
+    with pytest.raises(ValueError):
+        Sink(concurrency=0)
+
+
+@pytest.mark.asyncio
+async def test_concurrency_ordered_answers(event_loop):
+    values = [3, 1, 2, 1, 1, 1]
+    answers = []
+
+    async def source():
+        for value in values:
+            answer = yield value
+            answers.append(answer)
+
+    sink = SlowSink(source, concurrency=3)
+    await sink.start()
+    await sink._run_fut
+    # the answers follow the source order, even if the first value is
+    # the slowest, and each one is paired with the value it answers
+    answers = [a for a in answers if a is not None]
+    assert answers == [(v, v * 10) for v in values[:len(answers)]]
+    assert len(answers) >= 3
+    assert list(sink) == [1, 2, 3, 1, 1, 1]
+
+
+@pytest.mark.asyncio
+async def test_concurrency_cancel_closes_source(event_loop):
+    closed = []
+
+    class Failing(SlowSink):
+        async def _destination(self, element):
+            await super()._destination(element)
+            raise ZeroDivisionError()
+
+    async def source():
+        try:
+            for value in [2, 2, 2, 2]:
+                yield value
+        finally:
+            closed.append(True)
+
+    sink = Failing(source, concurrency=2)
+    await sink.start()
+    await asyncio.sleep(1)
+    await sink.stop()
+    # the errors of the values in flight don't replace the cancellation
+    assert closed == [True]
+    assert sink.in_flight == 0
+
+
+@pytest.mark.asyncio
+async def test_concurrency_stop_and_checkpoint(event_loop, tmp_path):
+    log = tmp_path / 'log'
+    log.write_bytes(b''.join(b'%d\n' % v for v in [5, 1, 1, 1, 1, 1, 1]))
+    store = FileCheckpointStore(str(tmp_path / 'checkpoints.json'))
+    tail = FileTail(str(log), loop=event_loop)
+
+    class IntSink(SlowSink):
+        async def _destination(self, element):
+            return await super()._destination(int(element))
+
+    sink = IntSink(tail, concurrency=3, checkpoint=store,
+                   checkpoint_name='log', checkpoint_every=1)
+    await sink.start()
+    await asyncio.sleep(2.5)
+    # the values after the first are done, but the window can't move
+    # on while it's in flight and nothing is acknowledged
+    assert list(sink) == [1, 1]
+    assert store.load('log') is None
+    await sink.stop()
+    # stop waited for the values in flight
+    assert event_loop.time() == pytest.approx(5)
+    assert list(sink) == [1, 1, 5]
+    assert store.load('log') == 6
+
+
+@pytest.mark.asyncio
+async def test_concurrency_error(event_loop):
+    class Failing(SlowSink):
+        async def _destination(self, element):
+            if element == 2:
+                raise ZeroDivisionError()
+            return await super()._destination(element)
+
+    sink = Failing(make_async_gen([1, 2, 1, 1, 1, 1]), concurrency=2)
+    await sink.start()
+    with pytest.raises(ZeroDivisionError):
+        await sink._run_fut
+    assert sink.in_flight == 0
+    assert not sink.active
@@ -0,0 +1,150 @@
+# -*- coding: utf-8 -*-
+# :Project:   metapensiero.util.stream -- error policies tests
+# :Created:   lun 19 ott 2026 17:46:25 CEST
+# :Author:    Alberto Berti <alberto@metapensiero.it>
+# :License:   GNU General Public License version 3 or later
+# :Copyright: © 2026 Alberto Berti
+#
+
+import pytest
+
+from metapensiero.util.stream import ERROR_POLICY, Selector, Tee
+from metapensiero.util.stream.testing import make_async_gen
+
+
+class AnException(Exception):
+    pass
+
+
+def flaky_source(values, failures):
+    """Return a callable source that fails the first `failures` times it's
+    iterated."""
+    runs = []
+
+    async def source():
+        runs.append(None)
+        for v in values:
+            yield v
+            if len(runs) <= failures:
+                raise AnException(len(runs))
+
+    return source
+
+
+@pytest.mark.asyncio
+async def test_selector_isolate():
+    errors = []
+    exc = AnException()
+    source_1 = make_async_gen([0, 1, exc, 2], step_delay=0.01)
+    source_2 = make_async_gen(['a', 'b', 'c'], step_delay=0.02)
+    sel = Selector(source_1, source_2, error_policy=ERROR_POLICY.ISOLATE,
+                   on_error=errors.append)
+    result = [v async for v in sel]
+    assert sorted(result, key=str) == [0, 1, 'a', 'b', 'c']
+    assert len(errors) == 1
+    assert errors[0].exc is exc
+    assert errors[0].source is source_1
+
+
+@pytest.mark.asyncio
+async def test_selector_per_source_policy():
+    source_1 = make_async_gen([0, AnException()], step_delay=0.01)
+    source_2 = make_async_gen([1, AnException()], initial_delay=0.1)
+    sel = Selector(source_1, error_policy=ERROR_POLICY.ISOLATE)
+    sel.add(source_2, error_policy=ERROR_POLICY.FAIL)
+    result = []
+    with pytest.raises(AnException):
+        async for v in sel:
+            result.append(v)
+    assert result == [0, 1]
+
+
+@pytest.mark.asyncio
+async def test_selector_retry():
+    errors = []
+
+    async def on_error(error):
+        errors.append(error.exc.args[0])
+
+    source = flaky_source([1, 2], failures=2)
+    sel = Selector(source, error_policy=ERROR_POLICY.RETRY, on_error=on_error,
+                   retry_delay=0.01)
+    assert [v async for v in sel] == [1, 1, 1, 2]
+    assert errors == [1, 2]
+
+    runs = []
+
+    async def broken_source():
+        runs.append(None)
+        raise AnException()
+        yield
+
+    sel = Selector(broken_source, error_policy=ERROR_POLICY.RETRY,
+                   retries=2, retry_delay=0.01)
+    with pytest.raises(AnException):
+        [v async for v in sel]
+    assert len(runs) == 3
+
+
+@pytest.mark.asyncio
+async def test_tee_retry():
+    errors = []
+    tee = Tee(flaky_source([1, 2], failures=1),
+              error_policy=ERROR_POLICY.RETRY, on_error=errors.append,
+              retry_delay=0.01)
+    ch1 = tee.__aiter__()
+    ch2 = tee.__aiter__()
+    data1 = [e async for e in ch1]
+    data2 = [e async for e in ch2]
+    assert data1 == data2 == [1, 1, 2]
+    assert len(errors) == 1
+
+
+@pytest.mark.asyncio
+async def test_tee_consumer_isolate():
+    tee = Tee(make_async_gen([1, 2, AnException()], step_delay=0.01))
+    ch1 = tee.subscribe(error_policy=ERROR_POLICY.ISOLATE)
+    ch2 = tee.subscribe()
+    assert [e async for e in ch1] == [1, 2]
+    data2 = []
+    with pytest.raises(AnException):
+        async for e in ch2:
+            data2.append(e)
+    assert data2 == [1, 2]
+
+    with pytest.raises(ValueError):
+        tee.subscribe(error_policy=ERROR_POLICY.RETRY)
+
+
+@pytest.mark.asyncio
+async def test_isolate_without_on_error_logs(caplog):
+    exc = AnException()
+    sel = Selector(make_async_gen([1, exc]),
+                   error_policy=ERROR_POLICY.ISOLATE)
+    assert [v async for v in sel] == [1]
+    records = [r for r in caplog.records if r.exc_info]
+    assert len(records) == 1
+    assert records[0].exc_info[1] is exc
+
+
+@pytest.mark.asyncio
+async def test_retry_generator_object_fails():
+    errors = []
+    sel = Selector(make_async_gen([1, AnException()])(),
+                   error_policy=ERROR_POLICY.RETRY, on_error=errors.append,
+                   retry_delay=0.01)
+    result = []
+    with pytest.raises(AnException):
+        async for v in sel:
+            result.append(v)
+    assert result == [1]
+
+    tee = Tee(make_async_gen([1, AnException()])(),
+              error_policy=ERROR_POLICY.RETRY, on_error=errors.append,
+              retry_delay=0.01)
+    result = []
+    with pytest.raises(AnException):
+        async for v in tee:
+            result.append(v)
+    assert result == [1]
+    assert errors == []
@@ -0,0 +1,129 @@
+# -*- coding: utf-8 -*-
+# :Project:   metapensiero.util.stream -- Pipeline class tests
+# :Created:   lun 19 ott 2026 19:02:37 CEST
+# :Author:    Alberto Berti <alberto@metapensiero.it>
+# :License:   GNU General Public License version 3 or later
+# :Copyright: © 2026 Alberto Berti
+#
+
+import asyncio
+import itertools
+
+import pytest
+
+from metapensiero.util.stream import (Pipeline, PIPELINE_STATUS, Selector,
+                                      Sink, Tee, Transformer)
+from metapensiero.util.stream.dest import Destination
+from metapensiero.util.stream.testing import profile
+
+
+async def counter(delay=0.01):
+    for i in itertools.count():
+        yield i
+        await asyncio.sleep(delay)
+
+
+class SlowSink(Sink):
+
+    async def _destination(self, element):
+        await asyncio.sleep(0.05)
+        await super()._destination(element)
+
+
+@pytest.mark.asyncio
+async def test_pipeline_drain():
+    tee = Tee(counter)
+    sink1 = Sink(Transformer(lambda v: v * 2, source=tee))
+    sink2 = SlowSink(tee)
+
+    pipeline = Pipeline(sink1, sink2, drain_timeout=5)
+    assert pipeline.stages.index(tee) < pipeline.stages.index(sink1)
+    async with pipeline:
+        assert pipeline.status is PIPELINE_STATUS.STARTED
+        await asyncio.sleep(0.2)
+
+    assert pipeline.status is PIPELINE_STATUS.STOPPED
+    assert not pipeline.forced
+    # every value pulled by the tee reached both the sinks
+    assert list(sink1) == [v * 2 for v in sink2]
+    assert len(sink1) > 10
+    assert set(pipeline.shutdown_latency) == set(pipeline.stages)
+    # the slow sink had to consume its backlog
+    assert (pipeline.shutdown_latency[sink2] >
+            pipeline.shutdown_latency[sink1])
+
+
+@pytest.mark.asyncio
+async def test_pipeline_push_and_selector():
+    tee = Tee(push_mode=True)
+    sink = Sink(Selector(tee, counter))
+    async with Pipeline(sink) as pipeline:
+        for i in range(5):
+            tee.push('v%d' % i)
+        await asyncio.sleep(0.05)
+    assert not pipeline.forced
+    assert [v for v in sink if isinstance(v, str)] == ['v0', 'v1', 'v2', 'v3',
+                                                       'v4']
+
+
+@pytest.mark.asyncio
+async def test_pipeline_deadline():
+
+    class Stuck(Destination):
+
+        async def _destination(self, element):
+            await asyncio.sleep(10)
+
+    tee = Tee(counter)
+    stuck = Stuck(tee)
+    pipeline = Pipeline(stuck)
+    await pipeline.start()
+    await asyncio.sleep(0.05)
+    latency = await pipeline.drain(0.1)
+    assert pipeline.forced == {stuck}
+    assert 0.1 <= latency[stuck] < 1
+    assert not stuck.active
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize('through_transformer', [False, True])
+async def test_pipeline_drain_completes_started(through_transformer):
+    started = []
+    done = []
+
+    class Recorder(Destination):
+
+        async def _destination(self, element):
+            started.append(element)
+            await asyncio.sleep(0.05)
+            done.append(element)
+
+    source = counter(0.001)
+    if through_transformer:
+        source = Transformer(None, None, source)
+    recorder = Recorder(source)
+    pipeline = Pipeline(recorder, drain_timeout=5)
+    async with pipeline:
+        await asyncio.sleep(0.12)
+    assert not pipeline.forced
+    assert len(started) > 1
+    assert started == done
+    assert not recorder.active
+
+
+@pytest.mark.asyncio
+async def test_pipeline_drain_idle_source():
+    tee = Tee(push_mode=True)
+
+    async def idle():
+        yield 'first'
+        await asyncio.sleep(10)
+        yield 'never'
+
+    sink = Sink(Selector(tee, Transformer(str.upper, None, idle)))
+    with profile(max_duration=1):
+        async with Pipeline(sink) as pipeline:
+            tee.push('pushed')
+            await asyncio.sleep(0.05)
+    assert not pipeline.forced
+    assert sorted(sink) == ['FIRST', 'pushed']
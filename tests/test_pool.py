@@ -0,0 +1,131 @@
+# -*- coding: utf-8 -*-
+# :Project:   metapensiero.util.stream -- SourcePool class tests
+# :Created:   lun 19 ott 2026 14:58:03 CEST
+# :Author:    Alberto Berti <alberto@metapensiero.it>
+# :License:   GNU General Public License version 3 or later
+# :Copyright: © 2026 Alberto Berti
+#
+
+import asyncio
+
+import pytest
+
+from metapensiero.util.stream import Selector, SourcePool
+
+
+class Connection:
+
+    def __init__(self, name, fail_at=None):
+        self.name = name
+        self.fail_at = fail_at
+        self.closed = False
+        self.count = 0
+
+    async def read(self, count):
+        for _ in range(count):
+            await asyncio.sleep(0.01)
+            self.count += 1
+            if self.count == self.fail_at:
+                raise ConnectionError(self.name)
+            yield (self.name, self.count)
+
+
+@pytest.mark.asyncio
+async def test_pool_reuses_connections():
+    opened = []
+
+    async def connect(key):
+        conn = Connection(key)
+        opened.append(conn)
+        return conn
+
+    pool = SourcePool(connect)
+    sources = [pool.source(k, lambda c: c.read(3)) for k in 'ab']
+    sel = Selector(*sources)
+
+    assert len([v async for v in sel]) == 6
+    assert len([v async for v in sel]) == 6
+    assert len(opened) == 2
+    assert [v async for v in sources[0]()] == [('a', 7), ('a', 8),
+                                               ('a', 9)]
+    assert pool.stats == {'connections': 2, 'connects': 2, 'failures': 0}
+
+
+@pytest.mark.asyncio
+async def test_pool_restarts_failed_sources():
+    opened = []
+
+    def connect(key):
+        conn = Connection(key, fail_at=2 if not opened else None)
+        opened.append(conn)
+        return conn
+
+    def close(conn):
+        conn.closed = True
+
+    pool = SourcePool(connect, close=close, backoff=0.01)
+    sel = Selector(pool.source('a', lambda c: c.read(3)))
+
+    assert [v async for v in sel] == [('a', 1), ('a', 1), ('a', 2),
+                                      ('a', 3)]
+    assert len(opened) == 2
+    assert opened[0].closed and not opened[1].closed
+    assert pool.stats == {'connections': 1, 'connects': 2, 'failures': 1}
+
+    await pool.close()
+    assert opened[1].closed
+    assert len(pool) == 0
+
+
+@pytest.mark.asyncio
+async def test_pool_max_retries():
+
+    def connect(key):
+        raise ConnectionRefusedError(key)
+
+    pool = SourcePool(connect, retries=2, backoff=0.01)
+    sel = Selector(pool.source('a', lambda c: c.read(3)))
+    with pytest.raises(ConnectionRefusedError):
+        [v async for v in sel]
+    assert pool.failures == 3
+
+
+@pytest.mark.asyncio
+async def test_pool_discard_while_connecting():
+    connecting = []
+
+    async def connect(key):
+        connecting.append(key)
+        await asyncio.sleep(0.05)
+        connecting.remove(key)
+        return Connection(key)
+
+    pool = SourcePool(connect)
+    first = asyncio.ensure_future(pool.acquire('a'))
+    await asyncio.sleep(0.01)
+    await pool.discard('a')
+    second = asyncio.ensure_future(pool.acquire('a'))
+    await asyncio.sleep(0.01)
+    # the second acquirer waits for the first one to connect
+    assert connecting == ['a']
+    assert await first is await second
+    assert pool.connects == 1
+
+
+@pytest.mark.asyncio
+async def test_pool_closes_inner_generator():
+    closed = []
+
+    async def read(conn):
+        try:
+            async for value in conn.read(3):
+                yield value
+        finally:
+            closed.append(conn.name)
+
+    pool = SourcePool(Connection)
+    agen = pool.source('a', read)()
+    assert await agen.__anext__() == ('a', 1)
+    with pytest.raises(asyncio.CancelledError):
+        await agen.athrow(asyncio.CancelledError())
+    assert closed == ['a']
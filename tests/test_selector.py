@@ -7,11 +7,12 @@
 # :Copyright: © 2016, 2017, 2018 Alberto Berti, James Stidard
 #
 
+import asyncio
 from functools import partial
 
 import pytest
 
-from metapensiero.util.stream import Selector
+from metapensiero.util.stream import ERROR_POLICY, MergeSelector, Selector
 from metapensiero.util.stream.testing import (
     gen, echo_gen, make_async_gen, profile)
 
@@ -197,3 +198,106 @@ async def test_non_raised_exception_passes():
             break
 
     assert result == expected
+
+
+@pytest.mark.asyncio
+async def test_merge_selector():
+    source_1 = make_async_gen([1, 4, 7, 10], step_delay=0.05)
+    source_2 = make_async_gen([2, 3, 8], initial_delay=0.1)
+    source_3 = make_async_gen([0, 5, 6, 9], step_delay=0.01)
+
+    result = [v async for v in MergeSelector(source_1, source_2, source_3)]
+    assert result == list(range(11))
+
+    source_1 = make_async_gen([{'t': 3}, {'t': 1}], raise_exc=False)
+    source_2 = make_async_gen([{'t': 2}])
+    sel = MergeSelector(source_1(), source_2(), key=lambda e: -e['t'])
+    assert [e['t'] async for e in sel] == [3, 2, 1]
+
+
+@pytest.mark.asyncio
+async def test_merge_selector_stalled_source():
+    source_1 = make_async_gen([1, 2, 3])
+    source_2 = make_async_gen([0, 4], step_delay=0.5)
+
+    with profile(max_duration=1.2):
+        sel = MergeSelector(source_1, source_2, timeout=0.1)
+        result = [v async for v in sel]
+    # the first value of the second source arrives late
+    assert result == [1, 2, 3, 0, 4]
+
+
+@pytest.mark.asyncio
+async def test_selector_does_not_compare_values():
+
+    class Ambiguous:
+
+        def __eq__(self, other):
+            raise ValueError("The truth value is ambiguous")
+
+        __hash__ = object.__hash__
+
+    values = [Ambiguous(), Ambiguous()]
+    result = [v async for v in Selector(make_async_gen(values))]
+    assert all(a is b for a, b in zip(result, values))
+    assert len(result) == 2
+
+
+@pytest.mark.asyncio
+async def test_selector_credits():
+    produced = []
+    received = []
+
+    async def rpc_source():
+        for i in range(6):
+            produced.append(i)
+            v = yield i
+            received.append(v)
+
+    sel = Selector(rpc_source, credits=3)
+    ch = sel.__aiter__()
+    data = [await ch.asend(None)]
+    await asyncio.sleep(0.01)
+    # the source ran ahead by three values
+    assert produced == [0, 1, 2]
+    data.extend([v async for v in ch])
+    assert data == list(range(6))
+    assert received == [None] * 6
+
+    # the sent values reach the source paired with the values they
+    # answer
+    received.clear()
+    ch = sel.__aiter__()
+    data = [await ch.asend(None)]
+    with pytest.raises(StopAsyncIteration):
+        while True:
+            data.append(await ch.asend('r%d' % data[-1]))
+    assert data == list(range(6))
+    answers = [v for v in received if v is not None]
+    assert answers == [(i, 'r%d' % i) for i in range(len(answers))]
+    assert len(answers) >= 3
+
+    produced.clear()
+    ch = sel.__aiter__()
+    await ch.asend(None)
+    await asyncio.sleep(0.01)
+    assert produced == [0, 1, 2]
+    sel.grant(rpc_source, 2)
+    await asyncio.sleep(0.01)
+    assert produced == [0, 1, 2, 3, 4]
+    await ch.aclose()
+
+
+@pytest.mark.asyncio
+async def test_merge_selector_options():
+    errors = []
+    source_1 = make_async_gen([1, 3, RuntimeError()])
+    source_2 = make_async_gen([2, 4])
+    sel = MergeSelector(source_1, source_2,
+                        error_policy=ERROR_POLICY.ISOLATE,
+                        on_error=errors.append)
+    assert [v async for v in sel] == [1, 2, 3, 4]
+    assert len(errors) == 1
+
+    with pytest.raises(ValueError):
+        MergeSelector(source_1, source_2, credits=2)
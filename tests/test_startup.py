@@ -0,0 +1,60 @@
+# -*- coding: utf-8 -*-
+# :Project:   metapensiero.util.stream -- package import time tests
+# :Created:   lun 19 ott 2026 15:34:50 CEST
+# :Author:    Alberto Berti <alberto@metapensiero.it>
+# :License:   GNU General Public License version 3 or later
+# :Copyright: © 2026 Alberto Berti
+#
+
+import os
+import subprocess
+import sys
+
+import pytest
+
+import metapensiero.util.stream
+
+
+# Cumulative import time budget of the package, in microseconds
+IMPORT_TIME_BUDGET = 20000
+
+
+def run_python(code, *options):
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(sys.path))
+    return subprocess.run([sys.executable] + list(options) + ['-c', code],
+                          stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                          env=env, universal_newlines=True, check=True)
+
+
+def test_import_is_lazy():
+    result = run_python(
+        "import sys, metapensiero.util.stream as s\n"
+        "heavy = ('asyncio', 'inspect', 'enum', 'pkg_resources')\n"
+        "print(sorted(m for m in heavy if m in sys.modules))\n"
+        "s.Tee\n"
+        "print('asyncio' in sys.modules)")
+    imported, asyncio_loaded = result.stdout.splitlines()
+    assert imported == '[]'
+    assert asyncio_loaded == 'True'
+
+
+def test_import_time_budget():
+    result = run_python("import metapensiero.util.stream", '-X', 'importtime')
+    timings = {}
+    for line in result.stderr.splitlines():
+        if line.startswith('import time:') and '|' in line:
+            _, cumulative, module = line[len('import time:'):].split('|')
+            if cumulative.strip().isdigit():
+                timings[module.strip()] = int(cumulative)
+    assert timings['metapensiero.util.stream'] < IMPORT_TIME_BUDGET
+
+
+def test_lazy_attributes():
+    stream = metapensiero.util.stream
+    for name in stream.__all__:
+        assert getattr(stream, name) is not None
+        assert name in dir(stream)
+    from metapensiero.util.stream.tee import Tee
+    assert stream.Tee is Tee
+    with pytest.raises(AttributeError):
+        stream.Missing
@@ -0,0 +1,68 @@
+# -*- coding: utf-8 -*-
+# :Project:   metapensiero.util.stream -- FileTail class tests
+# :Created:   mar 20 ott 2026 02:41:36 CEST
+# :Author:    Alberto Berti <alberto@metapensiero.it>
+# :License:   GNU General Public License version 3 or later
+# :Copyright: © 2026 Alberto Berti
+#
+
+import asyncio
+
+import pytest
+
+from metapensiero.util.stream import FileTail, Tee
+from metapensiero.util.stream.framing import encode_frames
+
+
+@pytest.mark.asyncio
+async def test_tail_lines(event_loop, tmp_path):
+    path = tmp_path / 'log'
+    path.write_bytes(b'one\ntwo\nthree\nincomplete')
+    tail = FileTail(str(path), chunk_size=5, loop=event_loop)
+    assert [r async for r in tail] == [b'one', b'two', b'three']
+    assert tail.offset == 14
+    with path.open('ab') as f:
+        f.write(b' line\nlast\n')
+    # the next iteration continues from the offset
+    assert [r async for r in tail] == [b'incomplete line', b'last']
+    tail.resume(4)
+    tail.with_offsets = True
+    assert [r async for r in tail][:2] == [(8, b'two'), (14, b'three')]
+
+    path.write_bytes(b'')
+    assert [r async for r in FileTail(str(path), loop=event_loop)] == []
+
+
+@pytest.mark.asyncio
+async def test_tail_frames(event_loop, tmp_path):
+    path = tmp_path / 'frames'
+    records = [b'a', b'', b'b\nc' * 1000]
+    path.write_bytes(encode_frames(records) + b'\x00\x00')
+    tail = FileTail(str(path), framing='length', loop=event_loop)
+    assert [r async for r in Tee(tail, loop=event_loop)] == records
+    with pytest.raises(ValueError):
+        FileTail(str(path), framing='xml')
+    tail = FileTail(str(path), framing='length', max_size=10,
+                    loop=event_loop)
+    with pytest.raises(ValueError):
+        [r async for r in tail]
+
+
+@pytest.mark.asyncio
+async def test_tail_follow(event_loop, tmp_path):
+    path = tmp_path / 'log'
+    path.write_bytes(b'one\n')
+    tail = FileTail(str(path), follow=True, poll_interval=0.01,
+                    loop=event_loop)
+    agen = tail.__aiter__()
+    assert await agen.__anext__() == b'one'
+    next_fut = asyncio.ensure_future(agen.__anext__(), loop=event_loop)
+    await asyncio.sleep(0.03, loop=event_loop)
+    assert not next_fut.done()
+    with path.open('ab') as f:
+        f.write(b'two\n')
+    assert await next_fut == b'two'
+    # truncated and rewritten
+    path.write_bytes(b'new\n')
+    assert await agen.__anext__() == b'new'
+    await agen.aclose()
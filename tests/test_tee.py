@@ -6,12 +6,14 @@
 # :Copyright: © 2018 Alberto Berti
 #
 
+import asyncio
 from functools import partial
+import threading
 
 import pytest
 
-from metapensiero.util.stream import Tee, TEE_STATUS
-from metapensiero.util.stream.testing import gen, echo_gen
+from metapensiero.util.stream import ERROR_POLICY, Tee, TEE_STATUS
+from metapensiero.util.stream.testing import gen, echo_gen, make_async_gen
 
 
 @pytest.mark.asyncio
@@ -24,7 +26,7 @@ async def test_tee(event_loop):
     data2 = [e async for e in ch2]
 
     assert len(data1) == len(data2) == 10
-    assert len(tee._queues) == 0
+    assert len(tee._consumers) == 0
     assert tee._status == TEE_STATUS.STOPPED
 
     ch1 = tee.__aiter__()
@@ -129,3 +131,217 @@ async def test_tee_push_mode(event_loop):
     assert data1 == data2 == ['b']
     assert sent_values == [1, 'c']
     tee.close()
+
+
+class Ambiguous:
+    """A value that can't be compared, like numpy arrays."""
+
+    def __eq__(self, other):
+        raise ValueError("The truth value is ambiguous")
+
+    __hash__ = object.__hash__
+
+
+@pytest.mark.asyncio
+async def test_tee_does_not_compare_values(event_loop):
+    values = [Ambiguous(), Ambiguous(), ValueError('not raised')]
+    tee = Tee(make_async_gen(values, raise_exc=False))
+    ch1 = tee.__aiter__()
+    ch2 = tee.__aiter__()
+    data1 = [e async for e in ch1]
+    data2 = [e async for e in ch2]
+
+    assert len(data1) == len(data2) == 3
+    assert all(a is b for a, b in zip(data1, values))
+    assert all(a is b for a, b in zip(data2, values))
+
+
+@pytest.mark.asyncio
+async def test_tee_credits(event_loop):
+    produced = []
+    received = []
+
+    async def rpc_source():
+        for i in range(5):
+            produced.append(i)
+            v = yield i
+            received.append(v)
+
+    tee = Tee(rpc_source, await_send=True, credits=2)
+    ch = tee.__aiter__()
+    v = await ch.asend(None)
+    await asyncio.sleep(0.01)
+    assert produced == [0, 1]
+    data = [v]
+    for _ in range(4):
+        data.append(await ch.asend('r%d' % data[-1]))
+    assert data == [0, 1, 2, 3, 4]
+    # each answer comes paired with the value it replies to
+    assert received == [None, (0, 'r0'), (1, 'r1'), (2, 'r2'), (3, 'r3')]
+    tee.grant(1)
+    assert tee.credits == 3
+    await ch.aclose()
+
+
+@pytest.mark.asyncio
+async def test_tee_push_threadsafe(event_loop):
+    tee = Tee(push_mode=True)
+    ch1 = tee.__aiter__()
+    ch2 = tee.__aiter__()
+    wakeups = []
+    push_foreign = tee._push_foreign
+
+    def counting_push_foreign(*args):
+        wakeups.append(None)
+        push_foreign(*args)
+
+    tee._push_foreign = counting_push_foreign
+
+    def producer(name):
+        for i in range(10000):
+            tee.push_threadsafe((name, i))
+
+    threads = [threading.Thread(target=producer, args=(n,)) for n in 'ab']
+    for t in threads:
+        t.start()
+
+    def close():
+        for t in threads:
+            t.join()
+        tee.close_threadsafe()
+
+    closer = threading.Thread(target=close)
+    closer.start()
+    data1 = [e async for e in ch1]
+    data2 = [e async for e in ch2]
+    closer.join()
+
+    assert data1 == data2
+    assert len(data1) == 20000
+    for name in 'ab':
+        assert [i for n, i in data1 if n == name] == list(range(10000))
+    # values are pushed in batches
+    assert len(wakeups) < 20000
+
+
+@pytest.mark.asyncio
+async def test_tee_topics(event_loop):
+    tee = Tee(push_mode=True, loop=event_loop, key=lambda v: v[0])
+    everything = tee.__aiter__()
+    orders = tee.subscribe(key='orders.new')
+    all_orders = tee.subscribe(prefix='orders.')
+    big = tee.subscribe(predicate=lambda v: v[1] > 10)
+    for value in [('orders.new', 1), ('orders.paid', 20), ('users.new', 30),
+                  ('orders.new', 40)]:
+        tee.push(value)
+    tee.push(ZeroDivisionError())
+    tee.close()
+
+    async def collect(consumer):
+        result = []
+        with pytest.raises(ZeroDivisionError):
+            async for v in consumer:
+                result.append(v[1])
+        return result
+
+    assert await collect(everything) == [1, 20, 30, 40]
+    assert await collect(orders) == [1, 40]
+    assert await collect(all_orders) == [1, 20, 40]
+    assert await collect(big) == [20, 30, 40]
+    assert not tee._consumers
+    assert not tee._routed
+    assert tee._by_key == tee._by_prefix == {}
+
+
+@pytest.mark.asyncio
+async def test_tee_topics_unsliceable_keys(event_loop):
+    tee = Tee(push_mode=True, loop=event_loop, key=lambda v: v)
+    everything = tee.__aiter__()
+    prefixed = tee.subscribe(prefix='ab')
+    for value in [5, 'abc', None, ('a', 'b'), 'xy']:
+        tee.push(value)
+    tee.close()
+    assert [v async for v in everything] == [5, 'abc', None, ('a', 'b'),
+                                             'xy']
+    assert [v async for v in prefixed] == ['abc']
+
+
+@pytest.mark.asyncio
+async def test_tee_topics_routing_errors(event_loop):
+    errors = []
+    values = [{'k': 'a', 'n': 1}, 7, {'k': 'a', 'n': 2}]
+    tee = Tee(make_async_gen(values), loop=event_loop,
+              key=lambda v: v['k'], on_error=errors.append)
+    everything = tee.__aiter__()
+    strict = tee.subscribe(key='a')
+    lenient = tee.subscribe(key='a', error_policy=ERROR_POLICY.ISOLATE)
+    big = tee.subscribe(predicate=lambda v: v['n'] > 1,
+                        error_policy=ERROR_POLICY.ISOLATE)
+    # the errors of the routing functions reach only the consumers they
+    # concern, not the whole stream
+    assert [v async for v in everything] == values
+    assert [v async for v in lenient] == [values[0], values[2]]
+    assert [v async for v in big] == [values[2]]
+    result = []
+    with pytest.raises(TypeError):
+        async for v in strict:
+            result.append(v)
+    assert result == [values[0]]
+    assert [type(e.exc) for e in errors] == [TypeError, TypeError]
+
+
+@pytest.mark.asyncio
+async def test_tee_topics_routing(event_loop):
+    tee = Tee(make_async_gen(range(100)), loop=event_loop,
+              key=lambda v: v % 10)
+    consumers = [tee.subscribe(key=k) for k in range(10)]
+    # each queue gets only its values and the end marker
+    await asyncio.sleep(0.01, loop=event_loop)
+    assert [len(c.queue) for c in tee._consumers] == [11] * 10
+    results = []
+    for consumer in consumers:
+        results.append([v async for v in consumer])
+    assert results == [list(range(k, 100, 10)) for k in range(10)]
+
+    with pytest.raises(ValueError):
+        tee.subscribe(key=1, predicate=bool)
+    with pytest.raises(ValueError):
+        Tee(push_mode=True, loop=event_loop).subscribe(prefix='a')
+
+
+@pytest.mark.asyncio
+async def test_tee_lanes(event_loop):
+    tee = Tee(push_mode=True, loop=event_loop, lanes=2)
+    consumer = tee.__aiter__()
+    for i in range(1000):
+        tee.push(i)
+    tee.push('shutdown', lane=0)
+    # the urgent message skips the backlog
+    assert await consumer.__anext__() == 'shutdown'
+    tee.push('reload', lane=0)
+    assert await consumer.__anext__() == 'reload'
+    assert await consumer.__anext__() == 0
+    tee.close()
+    assert len([v async for v in consumer]) == 999
+    with pytest.raises(ValueError):
+        Tee(push_mode=True, loop=event_loop, lanes=2).push(1, lane=2)
+    with pytest.raises(ValueError):
+        Tee(push_mode=True, loop=event_loop, lanes=2, lane_weights=[1])
+
+
+@pytest.mark.asyncio
+async def test_tee_weighted_lanes(event_loop):
+    tee = Tee(push_mode=True, loop=event_loop, lanes=3,
+              lane_weights=(3, 2, 1), key=lambda v: v[0])
+    consumer = tee.__aiter__()
+    routed = tee.subscribe(key='c')
+    for i in range(6):
+        for lane, name in enumerate('abc'):
+            tee.push((name, i), lane=lane)
+    tee.close()
+    result = [name async for name, _ in consumer]
+    # the lanes share the values according to their weights, and none
+    # is lost at the end
+    assert ''.join(result[:6]) == 'abacba'
+    assert sorted(result) == sorted('abc' * 6)
+    assert [i async for _, i in routed] == list(range(6))
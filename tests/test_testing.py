@@ -0,0 +1,95 @@
+# -*- coding: utf-8 -*-
+# :Project:   metapensiero.util.stream -- virtual time harness tests
+# :Created:   mar 20 ott 2026 00:34:15 CEST
+# :Author:    Alberto Berti <alberto@metapensiero.it>
+# :License:   GNU General Public License version 3 or later
+# :Copyright: © 2026 Alberto Berti
+#
+
+import asyncio
+import time
+
+import pytest
+
+from metapensiero.util.stream import (AdaptiveBatching, Batcher,
+                                      MergeSelector, Selector, Tee)
+from metapensiero.util.stream.testing import (Load, Meter, VirtualTimeLoop,
+                                              make_async_gen, profile)
+
+
+@pytest.fixture
+def event_loop():
+    loop = VirtualTimeLoop()
+    yield loop
+    loop.close()
+
+
+@pytest.mark.asyncio
+async def test_virtual_sleep(event_loop):
+    begin = time.perf_counter()
+    with profile(max_duration=3600, clock=event_loop.time):
+        await asyncio.sleep(3600, loop=event_loop)
+    assert event_loop.time() == 3600
+    assert time.perf_counter() - begin < 1
+    with pytest.raises(TimeoutError):
+        with profile(max_duration=0.5, clock=event_loop.time):
+            await asyncio.sleep(1, loop=event_loop)
+
+
+@pytest.mark.asyncio
+async def test_selector_blocking(event_loop):
+    source_1 = make_async_gen([1, 2, 3], step_delay=1)
+    source_2 = make_async_gen([1, 2, 3], step_delay=1)
+    begin = event_loop.time()
+    result = [v async for v in Selector(source_1(), source_2(),
+                                        loop=event_loop)]
+    assert result == [1, 1, 2, 2, 3, 3]
+    assert event_loop.time() - begin == pytest.approx(3)
+
+
+@pytest.mark.asyncio
+async def test_merge_selector_stalled_source(event_loop):
+    source_1 = make_async_gen([1, 3, 5])
+    source_2 = make_async_gen([2, 4], initial_delay=1)
+    sel = MergeSelector(source_1, source_2, timeout=0.1, loop=event_loop)
+    assert [v async for v in sel] == [1, 3, 5, 2, 4]
+    assert event_loop.time() == pytest.approx(1)
+
+
+@pytest.mark.asyncio
+async def test_load_phases(event_loop):
+    load = Load((1, 100), (1, 0), (0.5, 1000), burst=10, loop=event_loop)
+    meter = Meter(load)
+    await meter.consume(Tee(load, loop=event_loop))
+    assert load.count == meter.count == 600
+    assert event_loop.time() == pytest.approx(2.5)
+    assert load.emitted[99] == pytest.approx(0.9)
+    assert load.emitted[100] == pytest.approx(2)
+    # the values of a burst are produced at once
+    assert load.emitted[109] == load.emitted[100]
+    meter.assert_throughput(200)
+    meter.assert_latency(99, 0)
+    with pytest.raises(AssertionError):
+        meter.assert_throughput(300)
+
+
+@pytest.mark.asyncio
+async def test_batcher_latency(event_loop):
+    load = Load((2, 1000), (2, 50), loop=event_loop)
+    meter = Meter(load)
+    ctl = AdaptiveBatching(0.05, min_size=1, max_size=256,
+                           max_linger=0.02)
+
+    async def slow(batch):
+        # a fixed cost per batch and a small one per value
+        await asyncio.sleep(0.005 + 0.0005 * len(batch), loop=event_loop)
+        for value in batch:
+            meter.arrived(value)
+
+    async for batch in Batcher(load, controller=ctl, loop=event_loop):
+        await slow(batch)
+    assert meter.count == 2100
+    meter.assert_throughput(500)
+    meter.assert_latency(99, 0.05)
+    with pytest.raises(AssertionError):
+        meter.assert_latency(50, 0.001)
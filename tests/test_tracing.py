@@ -0,0 +1,98 @@
+# -*- coding: utf-8 -*-
+# :Project:   metapensiero.util.stream -- Tracer class tests
+# :Created:   lun 19 ott 2026 23:41:52 CEST
+# :Author:    Alberto Berti <alberto@metapensiero.it>
+# :License:   GNU General Public License version 3 or later
+# :Copyright: © 2026 Alberto Berti
+#
+
+import asyncio
+
+import pytest
+
+from metapensiero.util.stream import (Selector, Sink, Tee, Tracer,
+                                      Transformer)
+from metapensiero.util.stream.testing import make_async_gen
+from metapensiero.util.stream.tracing import Histogram
+
+
+def test_histogram():
+    histogram = Histogram()
+    for i in range(99):
+        histogram.add(0.001)
+    histogram.add(1.0)
+    stats = histogram.stats
+    assert stats['count'] == 100
+    assert stats['max'] == 1.0
+    assert 0.001 <= stats['p50'] < 0.002
+    assert stats['p99'] < 0.002
+    assert histogram.percentile(100) == 1.0
+
+
+def test_handoff():
+    tracer = Tracer(1)
+    trace = tracer.sample()
+    value = object()
+    stage_1, stage_2 = object(), object()
+    tracer.handoff(trace, value, stage_1)
+    assert tracer.take(object(), stage_1) is None
+    # a trace can be taken only once
+    tracer.handoff(trace, value, stage_1)
+    assert tracer.take(value, stage_1) is trace
+    assert tracer.take(value, stage_1) is None
+    assert Tracer(0).wrap(value) is value
+
+    # the stages don't overwrite the traces of each other
+    other = tracer.sample()
+    tracer.handoff(trace, 1, stage_1)
+    tracer.handoff(other, 1, stage_2)
+    assert tracer.take(1, stage_2) is other
+    assert tracer.take(1, stage_1) is trace
+    # a stale trace isn't taken by a later value of its stage
+    tracer.handoff(trace, 1, stage_1)
+    assert tracer.take(2, stage_1) is None
+    assert tracer.take(1, stage_1) is None
+    tracer.handoff(trace, 1, stage_1)
+    tracer.discard(stage_1)
+    assert not tracer._handoffs
+
+
+@pytest.mark.asyncio
+async def test_tee_to_sink(event_loop):
+    tracer = Tracer(1)
+    tee = Tee(make_async_gen(range(10)), loop=event_loop, tracer=tracer)
+
+    async def slow(value):
+        await asyncio.sleep(0.001, loop=event_loop)
+        return value * 2
+
+    sinks = [Sink(Transformer(slow, None, tee, tracer=tracer),
+                  tracer=tracer) for _ in range(2)]
+    await asyncio.gather(*(s.start() for s in sinks), loop=event_loop)
+    await asyncio.gather(*(s._run_fut for s in sinks), loop=event_loop)
+    assert list(sinks[0]) == list(sinks[1]) == [v * 2 for v in range(10)]
+    stats = tracer.stats
+    assert set(stats) == {'tee.queue', 'transformer.process',
+                          'destination.process', 'end_to_end'}
+    assert all(hop['count'] == 20 for hop in stats.values())
+    assert stats['transformer.process']['mean'] >= 0.001
+    assert (stats['end_to_end']['max'] >=
+            stats['transformer.process']['max'])
+
+
+@pytest.mark.asyncio
+async def test_selector_sampling_off(event_loop):
+    tracer = Tracer(0)
+    selector = Selector(make_async_gen(range(5)), loop=event_loop,
+                        tracer=tracer)
+    sink = Sink(selector, tracer=tracer)
+    await sink.start()
+    await sink._run_fut
+    assert list(sink) == list(range(5))
+    assert tracer.stats == {}
+
+    tracer.sample_rate = 1
+    selector = Selector(make_async_gen(range(5)), loop=event_loop,
+                        tracer=tracer)
+    assert [v async for v in selector] == list(range(5))
+    assert tracer.stats['selector.queue']['count'] == 5
@@ -0,0 +1,105 @@
+# -*- coding: utf-8 -*-
+# :Project:   metapensiero.util.stream -- Transformer class tests
+# :Created:   lun 19 ott 2026 11:38:12 CEST
+# :Author:    Alberto Berti <alberto@metapensiero.it>
+# :License:   GNU General Public License version 3 or later
+# :Copyright: © 2026 Alberto Berti
+#
+
+import asyncio
+
+import pytest
+
+from metapensiero.util.stream import LRUCache, TTLCache, Transformer
+from metapensiero.util.stream.testing import make_async_gen
+
+
+@pytest.mark.asyncio
+async def test_transformer():
+    t = Transformer(lambda v: v * 2, source=make_async_gen([1, 2, 3]))
+    assert [v async for v in t] == [2, 4, 6]
+    assert t.stats is None
+
+
+@pytest.mark.asyncio
+async def test_transformer_cache():
+    calls = []
+
+    async def enrich(value):
+        calls.append(value['id'])
+        await asyncio.sleep(0.01)
+        return value['id'] * 10
+
+    values = [{'id': i} for i in [1, 2, 1, 1, 3, 2]]
+    cache = LRUCache(maxsize=10)
+    t = Transformer(enrich, source=make_async_gen(values), cache=cache,
+                    cache_key=lambda v: v['id'])
+    assert [v async for v in t] == [10, 20, 10, 10, 30, 20]
+    assert calls == [1, 2, 3]
+    assert t.stats == {'hits': 3, 'misses': 3, 'coalesced': 0, 'size': 3,
+                       'hit_rate': 0.5}
+
+
+@pytest.mark.asyncio
+async def test_transformer_cache_coalescing():
+    calls = []
+
+    async def enrich(value):
+        calls.append(value)
+        await asyncio.sleep(0.05)
+        return value.upper()
+
+    cache = TTLCache(60)
+    t1 = Transformer(enrich, source=make_async_gen(['a', 'b']), cache=cache)
+    t2 = Transformer(enrich, source=make_async_gen(['a', 'b']), cache=cache)
+
+    async def consume(t):
+        return [v async for v in t]
+
+    r1, r2 = await asyncio.gather(consume(t1), consume(t2))
+    assert r1 == r2 == ['A', 'B']
+    assert calls == ['a', 'b']
+    # the lookups waiting for a computation aren't misses
+    stats = cache.stats
+    assert (stats['misses'], stats['coalesced']) == (2, 2)
+    assert stats['hit_rate'] == 0.5
+
+
+@pytest.mark.asyncio
+async def test_transformer_cache_leader_cancelled(event_loop):
+
+    async def enrich(value):
+        await asyncio.sleep(0.05)
+        return value.upper()
+
+    cache = TTLCache(60)
+    t1 = Transformer(enrich, source=make_async_gen(['a', 'b']), cache=cache)
+    t2 = Transformer(enrich, source=make_async_gen(['a', 'b']), cache=cache)
+
+    async def consume(t):
+        return [v async for v in t]
+
+    task1 = event_loop.create_task(consume(t1))
+    await asyncio.sleep(0.01)
+    task2 = event_loop.create_task(consume(t2))
+    await asyncio.sleep(0.01)
+    task1.cancel()
+    assert await task2 == ['A', 'B']
+    # the computation restarted after the cancellation isn't a miss
+    stats = cache.stats
+    assert (stats['misses'], stats['coalesced']) == (2, 1)
+
+
+@pytest.mark.asyncio
+async def test_cache_errors_are_not_cached():
+    cache = LRUCache()
+
+    def fail(value):
+        raise ValueError(value)
+
+    with pytest.raises(ValueError):
+        await cache.fetch('a', fail, 'a')
+    assert len(cache) == 0
+    assert await cache.fetch('a', str.upper, 'a') == 'A'
+    assert await cache.fetch('a', str.upper, 'a') == 'A'
+    assert cache.stats['hits'] == 1